@@ -4,265 +4,303 @@ Database Viewer for Otium AI Agent
 Interactive tool to view and manage your database
 """
 
+import io
 import os
 import sys
-from datetime import datetime
-import json
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+from sqlalchemy import bindparam, func, select, text
 
 # Add the llm-os-agent directory to Python path
 sys.path.append(os.path.join(os.path.dirname(__file__), 'llm-os-agent'))
 
-def print_table_header(title):
-    """Print a formatted table header"""
-    print(f"\n{'='*60}")
-    print(f"📊 {title}")
-    print(f"{'='*60}")
+from database import AuditLog, Command, Connection, User, db_session, engine
+
+# Tables reported by show_database_stats
+STAT_TABLES = ['users', 'connections', 'commands', 'command_approvals', 'audit_logs', 'system_checkpoints']
+
+# Statements are built once so every menu refresh reuses the same statement
+# objects and hits the engine's compiled-statement cache. Read-only views select
+# plain columns so rows come back as tuples without ORM identity-map overhead.
+# IDs are cut to the 20-character display column by the database
+_ID_WIDTH = 20
+_USERS_QUERY = select(func.substr(User.id, 1, _ID_WIDTH).label("id_short"), User.email, User.role, User.last_login)
+_CONNECTIONS_QUERY = select(
+    func.substr(Connection.id, 1, _ID_WIDTH).label("id_short"),
+    Connection.user_id, Connection.hostname, Connection.status, Connection.connected_at
+)
+_RECENT_COMMANDS_QUERY = (
+    select(func.substr(Command.id, 1, _ID_WIDTH).label("id_short"), Command.user_id, Command.request,
+           Command.status, Command.risk_level, Command.created_at)
+    .order_by(Command.created_at.desc())
+    .limit(bindparam("limit"))
+)
+# Pick the recent commands first (index on commands.created_at), then join and
+# aggregate only their approvals
+_APPROVAL_STATUS_QUERY = text("""
+    WITH recent AS (
+        SELECT id, request, status, created_at
+        FROM commands
+        ORDER BY created_at DESC
+        LIMIT :limit
+    )
+    SELECT 
+        substr(r.id, 1, 20) as id_short,
+        r.request,
+        r.status,
+        COUNT(ca.id) as total_approvals,
+        COUNT(CASE WHEN ca.approved = true THEN 1 END) as approved_steps,
+        COUNT(CASE WHEN ca.approved = false THEN 1 END) as rejected_steps
+    FROM recent r
+    LEFT JOIN command_approvals ca ON r.id = ca.command_id
+    GROUP BY r.id, r.request, r.status, r.created_at
+    ORDER BY r.created_at DESC
+""")
+_AUDIT_LOGS_QUERY = (
+    select(AuditLog.user_id, AuditLog.action, AuditLog.success, AuditLog.timestamp, AuditLog.details)
+    .order_by(AuditLog.timestamp.desc())
+    .limit(bindparam("limit"))
+)
+# Table counts and command statistics in a single round trip (table names are
+# code-controlled, never user input)
+_DATABASE_STATS_QUERY = text(" UNION ALL ".join(
+    [f"SELECT '{table}' AS name, COUNT(*) AS n FROM {table}" for table in STAT_TABLES] + [
+        "SELECT 'commands_today' AS name, "
+        "COUNT(CASE WHEN created_at > NOW() - INTERVAL '24 hours' THEN 1 END) AS n FROM commands",
+        "SELECT 'pending_approvals' AS name, "
+        "COUNT(CASE WHEN status = 'pending_approval' THEN 1 END) AS n FROM commands",
+    ]
+))
+
+def _table_header(title):
+    """Render a formatted table header"""
+    return f"\n{'='*60}\n📊 {title}\n{'='*60}\n"
+
+def _row(cols, widths):
+    """Render one fixed-width table line, truncating each column to its width"""
+    return "".join(str(col)[:width].ljust(width + 1) for col, width in zip(cols, widths)) + "\n"
 
-def print_separator():
-    """Print a separator line"""
-    print("-" * 60)
+def _fit(value, width):
+    """Pad value to width, ending it with '...' when it does not fit"""
+    return (value if len(value) <= width else value[:width - 3] + "...").ljust(width)
 
+# Column widths and header rows (with their separator) are built once rather
+# than on every render
+_SEPARATOR = "-" * 60 + "\n"
+_USERS_WIDTHS = (20, 30, 10, 20)
+_USERS_HEADER = _row(('ID', 'Email', 'Role', 'Last Login'), _USERS_WIDTHS) + _SEPARATOR
+_CONNECTIONS_WIDTHS = (20, 20, 25, 12, 20)
+_CONNECTIONS_HEADER = _row(('ID', 'User', 'Hostname', 'Status', 'Connected'), _CONNECTIONS_WIDTHS) + _SEPARATOR
+_COMMANDS_WIDTHS = (20, 20, 40, 16, 8, 20)
+_COMMANDS_HEADER = _row(('ID', 'User', 'Request', 'Status', 'Risk', 'Created'), _COMMANDS_WIDTHS) + _SEPARATOR
+_APPROVALS_WIDTHS = (20, 40, 16, 8, 8)
+_APPROVALS_HEADER = _row(('Command ID', 'Request', 'Status', 'Approved', 'Rejected'), _APPROVALS_WIDTHS) + _SEPARATOR
+_AUDIT_WIDTHS = (20, 20, 8, 20)
+_AUDIT_HEADER = _row(('User', 'Action', 'Success', 'Timestamp'), _AUDIT_WIDTHS) + _SEPARATOR
+
+# Large result sets are read through a server-side cursor in fixed-size chunks
+_STREAM_OPTIONS = {"stream_results": True, "yield_per": 100}
+
+# Independent views run concurrently during "Refresh All"
+_POOL = ThreadPoolExecutor(max_workers=6)
+
+@lru_cache(maxsize=4096)
 def format_timestamp(timestamp):
-    """Format timestamp for display"""
+    """Format timestamp for display (cached; datetimes are immutable and hashable)"""
     if timestamp:
         return timestamp.strftime("%Y-%m-%d %H:%M:%S")
     return "N/A"
 
-def view_users():
-    """View all users"""
+def _render_users(db, buf):
+    """Render all users"""
+    # Get all users
+    users = db.execute(_USERS_QUERY).fetchall()
+    
+    buf.write(_table_header("USERS"))
+    if users:
+        buf.write(_USERS_HEADER)
+        buf.writelines(
+            _row((user.id_short, user.email, user.role, format_timestamp(user.last_login)), _USERS_WIDTHS)
+            for user in users
+        )
+    else:
+        buf.write("No users found\n")
+
+def _render_connections(db, buf):
+    """Render all connections"""
+    # Get all connections
+    connections = db.execute(_CONNECTIONS_QUERY).fetchall()
+    
+    buf.write(_table_header("SSH CONNECTIONS"))
+    if connections:
+        buf.write(_CONNECTIONS_HEADER)
+        buf.writelines(
+            _row((conn.id_short, conn.user_id, conn.hostname, conn.status, format_timestamp(conn.connected_at)),
+                 _CONNECTIONS_WIDTHS)
+            for conn in connections
+        )
+    else:
+        buf.write("No connections found\n")
+
+def _render_recent_commands(db, buf):
+    """Render recent commands"""
+    # Get recent commands
+    commands = db.execute(_RECENT_COMMANDS_QUERY, {"limit": 10}).fetchall()
+    
+    buf.write(_table_header("RECENT COMMANDS"))
+    if commands:
+        buf.write(_COMMANDS_HEADER)
+        buf.writelines(
+            _row((cmd.id_short, cmd.user_id, _fit(cmd.request, 40), cmd.status, cmd.risk_level,
+                  format_timestamp(cmd.created_at)), _COMMANDS_WIDTHS)
+            for cmd in commands
+        )
+    else:
+        buf.write("No commands found\n")
+
+def _render_approval_status(db, buf):
+    """Render step-by-step approval status"""
+    # Get commands with approval status
+    result = db.execute(_APPROVAL_STATUS_QUERY, {"limit": 10}, execution_options=_STREAM_OPTIONS)
+    
+    buf.write(_table_header("APPROVAL STATUS"))
+    found = False
+    for rows in result.partitions():
+        if not found:
+            buf.write(_APPROVALS_HEADER)
+            found = True
+        buf.writelines(
+            _row((row[0], _fit(row[1], 40), row[2], row[4], row[5]), _APPROVALS_WIDTHS)
+            for row in rows
+        )
+    if not found:
+        buf.write("No commands with approvals found\n")
+
+def _render_recent_audit_logs(db, buf):
+    """Render recent audit logs"""
+    # Get recent audit logs
+    result = db.execute(_AUDIT_LOGS_QUERY, {"limit": 15}, execution_options=_STREAM_OPTIONS)
+    
+    buf.write(_table_header("RECENT AUDIT LOGS"))
+    found = False
+    for rows in result.partitions():
+        if not found:
+            buf.write(_AUDIT_HEADER)
+            found = True
+        buf.writelines(
+            _row((row[0], row[1], "✅" if row[2] else "❌", format_timestamp(row[3])), _AUDIT_WIDTHS)
+            for row in rows
+        )
+    if not found:
+        buf.write("No audit logs found\n")
+
+def _render_database_stats(db, buf):
+    """Render database statistics"""
+    buf.write(_table_header("DATABASE STATISTICS"))
+    
+    # Get table counts and recent activity
     try:
-        from database import get_db
-        from database_service import DatabaseService
-        
-        db = next(get_db())
-        db_service = DatabaseService(db)
-        
-        # Get all users (we'll need to add this method)
-        users = db.query(db.query().from_statement(text("SELECT * FROM users")).all())
-        
-        print_table_header("USERS")
-        if users:
-            print(f"{'ID':<20} {'Email':<30} {'Role':<10} {'Last Login':<20}")
-            print_separator()
-            for user in users:
-                print(f"{user.id:<20} {user.email:<30} {user.role:<10} {format_timestamp(user.last_login):<20}")
-        else:
-            print("No users found")
-        
-        db.close()
+        counts = dict(db.execute(_DATABASE_STATS_QUERY).fetchall())
     except Exception as e:
-        print(f"❌ Error viewing users: {e}")
+        buf.write(f"❌ Could not get database statistics: {e}\n")
+    else:
+        buf.writelines(f"📋 {table:<20}: {counts[table]:>8} records\n" for table in STAT_TABLES)
+        buf.write("\n📊 Command Statistics:\n")
+        buf.write(f"   Total Commands: {counts['commands']}\n")
+        buf.write(f"   Commands Today: {counts['commands_today']}\n")
+        buf.write(f"   Pending Approvals: {counts['pending_approvals']}\n")
 
-def view_connections():
-    """View all connections"""
+# View renderers in "Refresh All" order, with the label used in error messages
+_VIEWS = [
+    (_render_database_stats, "Error getting database stats"),
+    (_render_users, "Error viewing users"),
+    (_render_connections, "Error viewing connections"),
+    (_render_recent_commands, "Error viewing commands"),
+    (_render_approval_status, "Error viewing approval status"),
+    (_render_recent_audit_logs, "Error viewing audit logs"),
+]
+
+def _render(render, error_label, db=None):
+    """Render one view into a buffer and return its text, opening a session if none is given"""
+    buf = io.StringIO()
     try:
-        from database import get_db
-        from database_service import DatabaseService
-        
-        db = next(get_db())
-        db_service = DatabaseService(db)
-        
-        # Get all connections
-        connections = db.query(db.query().from_statement(text("SELECT * FROM connections")).all())
-        
-        print_table_header("SSH CONNECTIONS")
-        if connections:
-            print(f"{'ID':<20} {'User':<20} {'Hostname':<25} {'Status':<12} {'Connected':<20}")
-            print_separator()
-            for conn in connections:
-                print(f"{conn.id[:20]:<20} {conn.user_id:<20} {conn.hostname:<25} {conn.status:<12} {format_timestamp(conn.connected_at):<20}")
-        else:
-            print("No connections found")
-        
-        db.close()
+        with db_session(db) as session:
+            render(session, buf)
+        return buf.getvalue()
     except Exception as e:
-        print(f"❌ Error viewing connections: {e}")
+        return f"❌ {error_label}: {e}\n"
+
+def view_users(db=None):
+    """View all users"""
+    sys.stdout.write(_render(_render_users, "Error viewing users", db))
+
+def view_connections(db=None):
+    """View all connections"""
+    sys.stdout.write(_render(_render_connections, "Error viewing connections", db))
 
-def view_recent_commands():
+def view_recent_commands(db=None):
     """View recent commands"""
-    try:
-        from database import get_db
-        from database_service import DatabaseService
-        
-        db = next(get_db())
-        db_service = DatabaseService(db)
-        
-        # Get recent commands
-        commands = db.query(db.query().from_statement(text("SELECT * FROM commands ORDER BY created_at DESC LIMIT 10")).all())
-        
-        print_table_header("RECENT COMMANDS")
-        if commands:
-            print(f"{'ID':<20} {'User':<20} {'Request':<40} {'Status':<15} {'Risk':<8} {'Created':<20}")
-            print_separator()
-            for cmd in commands:
-                request = cmd.request[:40] + "..." if len(cmd.request) > 40 else cmd.request
-                print(f"{cmd.id[:20]:<20} {cmd.user_id:<20} {request:<40} {cmd.status:<15} {cmd.risk_level:<8} {format_timestamp(cmd.created_at):<20}")
-        else:
-            print("No commands found")
-        
-        db.close()
-    except Exception as e:
-        print(f"❌ Error viewing commands: {e}")
+    sys.stdout.write(_render(_render_recent_commands, "Error viewing commands", db))
 
-def view_approval_status():
+def view_approval_status(db=None):
     """View step-by-step approval status"""
-    try:
-        from database import get_db
-        from database_service import DatabaseService
-        from sqlalchemy import text
-        
-        db = next(get_db())
-        db_service = DatabaseService(db)
-        
-        # Get commands with approval status
-        result = db.execute(text("""
-            SELECT 
-                c.id,
-                c.request,
-                c.status,
-                COUNT(ca.id) as total_approvals,
-                COUNT(CASE WHEN ca.approved = true THEN 1 END) as approved_steps,
-                COUNT(CASE WHEN ca.approved = false THEN 1 END) as rejected_steps
-            FROM commands c
-            LEFT JOIN command_approvals ca ON c.id = ca.command_id
-            GROUP BY c.id, c.request, c.status
-            ORDER BY c.created_at DESC
-            LIMIT 10
-        """))
-        
-        print_table_header("APPROVAL STATUS")
-        rows = result.fetchall()
-        if rows:
-            print(f"{'Command ID':<20} {'Request':<40} {'Status':<15} {'Approved':<8} {'Rejected':<8}")
-            print_separator()
-            for row in rows:
-                request = row[1][:40] + "..." if len(row[1]) > 40 else row[1]
-                print(f"{row[0][:20]:<20} {request:<40} {row[2]:<15} {row[4]:<8} {row[5]:<8}")
-        else:
-            print("No commands with approvals found")
-        
-        db.close()
-    except Exception as e:
-        print(f"❌ Error viewing approval status: {e}")
+    sys.stdout.write(_render(_render_approval_status, "Error viewing approval status", db))
 
-def view_recent_audit_logs():
+def view_recent_audit_logs(db=None):
     """View recent audit logs"""
-    try:
-        from database import get_db
-        from database_service import DatabaseService
-        from sqlalchemy import text
-        
-        db = next(get_db())
-        db_service = DatabaseService(db)
-        
-        # Get recent audit logs
-        result = db.execute(text("""
-            SELECT user_id, action, success, timestamp, details
-            FROM audit_logs
-            ORDER BY timestamp DESC
-            LIMIT 15
-        """))
-        
-        print_table_header("RECENT AUDIT LOGS")
-        rows = result.fetchall()
-        if rows:
-            print(f"{'User':<20} {'Action':<20} {'Success':<8} {'Timestamp':<20}")
-            print_separator()
-            for row in rows:
-                success_icon = "✅" if row[2] else "❌"
-                timestamp = format_timestamp(row[3]) if row[3] else "N/A"
-                print(f"{row[0]:<20} {row[1]:<20} {success_icon:<8} {timestamp:<20}")
-        else:
-            print("No audit logs found")
-        
-        db.close()
-    except Exception as e:
-        print(f"❌ Error viewing audit logs: {e}")
+    sys.stdout.write(_render(_render_recent_audit_logs, "Error viewing audit logs", db))
 
-def show_database_stats():
+def show_database_stats(db=None):
     """Show database statistics"""
-    try:
-        from database import get_db
-        from sqlalchemy import text
-        
-        db = next(get_db())
-        
-        print_table_header("DATABASE STATISTICS")
-        
-        # Get table counts
-        tables = ['users', 'connections', 'commands', 'command_approvals', 'audit_logs', 'system_checkpoints']
-        
-        for table in tables:
-            try:
-                result = db.execute(text(f"SELECT COUNT(*) FROM {table}"))
-                count = result.fetchone()[0]
-                print(f"📋 {table:<20}: {count:>8} records")
-            except Exception as e:
-                print(f"❌ {table:<20}: Error - {e}")
-        
-        # Get recent activity
-        try:
-            result = db.execute(text("""
-                SELECT 
-                    COUNT(*) as total_commands,
-                    COUNT(CASE WHEN created_at > NOW() - INTERVAL '24 hours' THEN 1 END) as commands_today,
-                    COUNT(CASE WHEN status = 'pending_approval' THEN 1 END) as pending_approvals
-                FROM commands
-            """))
-            stats = result.fetchone()
-            print(f"\n📊 Command Statistics:")
-            print(f"   Total Commands: {stats[0]}")
-            print(f"   Commands Today: {stats[1]}")
-            print(f"   Pending Approvals: {stats[2]}")
-        except Exception as e:
-            print(f"❌ Could not get command statistics: {e}")
-        
-        db.close()
-    except Exception as e:
-        print(f"❌ Error getting database stats: {e}")
+    sys.stdout.write(_render(_render_database_stats, "Error getting database stats", db))
+
+def refresh_all():
+    """Run every view concurrently, each worker on its own session, and print in menu order"""
+    futures = [_POOL.submit(_render, render, error_label) for render, error_label in _VIEWS]
+    sys.stdout.write("".join(future.result() for future in futures))
+
+# Menu banner and option dispatch are built once at import
+_MENU = "\n".join([
+    f"\n{'='*60}",
+    "🗄️  OTIUM AI AGENT DATABASE VIEWER",
+    f"{'='*60}",
+    "1. 📊 Database Statistics",
+    "2. 👥 View Users",
+    "3. 🔌 View SSH Connections",
+    "4. 📝 View Recent Commands",
+    "5. ✅ View Approval Status",
+    "6. 📋 View Recent Audit Logs",
+    "7. 🔄 Refresh All",
+    "0. ❌ Exit",
+    "-" * 60,
+])
+_DISPATCH = {
+    "1": show_database_stats,
+    "2": view_users,
+    "3": view_connections,
+    "4": view_recent_commands,
+    "5": view_approval_status,
+    "6": view_recent_audit_logs,
+    "7": refresh_all,
+}
 
 def interactive_menu():
     """Interactive menu for database viewing"""
     while True:
-        print(f"\n{'='*60}")
-        print("🗄️  OTIUM AI AGENT DATABASE VIEWER")
-        print(f"{'='*60}")
-        print("1. 📊 Database Statistics")
-        print("2. 👥 View Users")
-        print("3. 🔌 View SSH Connections")
-        print("4. 📝 View Recent Commands")
-        print("5. ✅ View Approval Status")
-        print("6. 📋 View Recent Audit Logs")
-        print("7. 🔄 Refresh All")
-        print("0. ❌ Exit")
-        print("-" * 60)
+        print(_MENU)
         
         choice = input("Select an option (0-7): ").strip()
         
         if choice == "0":
             print("👋 Goodbye!")
             break
-        elif choice == "1":
-            show_database_stats()
-        elif choice == "2":
-            view_users()
-        elif choice == "3":
-            view_connections()
-        elif choice == "4":
-            view_recent_commands()
-        elif choice == "5":
-            view_approval_status()
-        elif choice == "6":
-            view_recent_audit_logs()
-        elif choice == "7":
-            show_database_stats()
-            view_users()
-            view_connections()
-            view_recent_commands()
-            view_approval_status()
-            view_recent_audit_logs()
-        else:
+        
+        action = _DISPATCH.get(choice)
+        if action is None:
             print("❌ Invalid choice. Please try again.")
+        else:
+            action()
         
         input("\nPress Enter to continue...")
 
@@ -285,9 +323,8 @@ def main():
     
     # Check if we can connect
     try:
-        from database import get_db
-        db = next(get_db())
-        db.close()
+        # Checks out (and warms) a connection from the process-wide engine pool
+        engine.connect().close()
         print("✅ Database connection successful!")
     except Exception as e:
         print(f"❌ Database connection failed: {e}")
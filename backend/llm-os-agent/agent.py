@@ -4,19 +4,116 @@ Otium AI Agent - Simplified Phase 1
 SSH-based Linux system administration AI agent with core functionality only
 """
 
+import atexit
+import hashlib
+import json
+import logging
+import logging.handlers
 import os
+import queue
+import re
 import sys
-from typing import Dict, Any
+from typing import Dict, Any, Optional, Tuple
+
+from cachetools import TTLCache
 
 # Import our modules
 from command_generator import CommandGenerator
 from command_executor import CommandExecutor
 from ssh_system_detector import SSHSystemDetector
 
+logger = logging.getLogger(__name__)
+
+# Cheap single-call probe used to fingerprint a host before full detection
+SYSTEM_FINGERPRINT_COMMAND = "uname -a; cat /etc/os-release 2>/dev/null"
+
+# Detected context includes volatile fields (disk, memory, services), so entries
+# expire and are re-probed; the size bound caps memory across many hosts
+SYS_CTX_CACHE_SIZE = 256
+SYS_CTX_CACHE_TTL_SECONDS = 600
+
+# Last-known system context keyed by (hostname, fingerprint hash)
+_SYS_CTX_CACHE: TTLCache = TTLCache(maxsize=SYS_CTX_CACHE_SIZE, ttl=SYS_CTX_CACHE_TTL_SECONDS)
+
+# Listener started by configure_logging, once per process
+_LOG_LISTENER: Optional[logging.handlers.QueueListener] = None
+
+# Command generators are stateless apart from their inputs, so agents that start
+# with the same key against the same system share one (and its OpenAI client).
+# Each re-detected context is a new key, so entries expire along with the contexts
+_GEN_CACHE: TTLCache = TTLCache(maxsize=SYS_CTX_CACHE_SIZE, ttl=SYS_CTX_CACHE_TTL_SECONDS)
+
+
+def _get_command_generator(system_context: Dict[str, Any], api_key: str) -> CommandGenerator:
+    """Return a cached CommandGenerator for (api key, system context)"""
+    # Only a digest of the key is kept in the cache
+    key = (
+        hashlib.sha256(api_key.encode()).hexdigest(),
+        hashlib.sha256(json.dumps(system_context, sort_keys=True, default=str).encode()).hexdigest(),
+    )
+    generator = _GEN_CACHE.get(key)
+    if generator is None:
+        generator = _GEN_CACHE[key] = CommandGenerator(system_context, api_key=api_key)
+    return generator
+
+
+def configure_logging(level: str = "INFO") -> logging.handlers.QueueListener:
+    """Route root logging through a queue so callers never block on stream writes
+    
+    Handlers already on the root logger (e.g. from uvicorn's log_config) move behind
+    the queue; with none, a stream handler is used. Later calls return the running listener.
+    """
+    global _LOG_LISTENER
+    if _LOG_LISTENER is not None:
+        return _LOG_LISTENER
+    
+    root = logging.getLogger()
+    handlers = list(root.handlers)
+    if not handlers:
+        stream_handler = logging.StreamHandler()
+        stream_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+        handlers = [stream_handler]
+    
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.setLevel(level.upper())
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    
+    _LOG_LISTENER = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _LOG_LISTENER.start()
+    # Flush anything still queued on interpreter exit
+    atexit.register(_LOG_LISTENER.stop)
+    return _LOG_LISTENER
+
+
+def invalidate_system_context(hostname: str) -> None:
+    """Drop cached system contexts for a host"""
+    for key in [key for key in _SYS_CTX_CACHE if key[0] == hostname]:
+        _SYS_CTX_CACHE.pop(key, None)
+
 
 class Agent:
     """Simplified AI Agent for SSH-based Linux system administration"""
     
+    # Basic safety patterns for operations that require explicit approval
+    _DANGEROUS_PATTERNS = (
+        'rm -rf /',
+        'rm -rf /etc',
+        'rm -rf /var',
+        'rm -rf /usr',
+        'rm -rf /boot',
+        'dd if=/dev/',
+        'mkfs',
+        'fdisk',
+        'systemctl stop sshd',
+        'systemctl disable sshd',
+        'iptables -F',
+        'firewall-cmd --reload'
+    )
+    # Single case-insensitive alternation so each command is scanned once
+    _DANGEROUS_RE = re.compile("|".join(re.escape(p) for p in _DANGEROUS_PATTERNS), re.IGNORECASE)
+    
     def __init__(self, api_key: str, ssh_manager, connection_id: str):
         # Validate required parameters
         if not api_key:
@@ -35,62 +132,76 @@ class Agent:
         self.command_executor = None
         self.command_generator = None
         self.system_context = {}
+        self._system_cache_key = None
     
     def start(self) -> bool:
         """Start the agent and initialize environment"""
-        print("🚀 Starting Otium AI Agent...")
-        print("🔌 Starting in SSH mode...")
+        logger.debug("🚀 Starting Otium AI Agent in SSH mode...")
         
         try:
             # Validate SSH connection
             if not self.ssh_manager.is_connection_alive(self.connection_id):
-                print("❌ SSH connection not available or not alive")
+                logger.error("❌ SSH connection not available or not alive")
                 return False
             
-            print("✅ SSH connection validated")
+            logger.debug("✅ SSH connection validated")
             
             # Initialize command executor
-            print("🔧 Initializing command executor...")
             self.command_executor = CommandExecutor(ssh_manager=self.ssh_manager, connection_id=self.connection_id)
             self.command_executor.set_connection_id(self.connection_id)
-            print("✅ Command executor initialized")
+            logger.debug("✅ Command executor initialized")
             
             # Initialize system detector
-            print("🔍 Initializing system detector...")
             self.system_detector = SSHSystemDetector(self.ssh_manager, self.connection_id)
-            print("✅ System detector created")
+            logger.debug("✅ System detector created")
             
-            # Detect system
-            print("🔍 Detecting system...")
-            self.system_context = self.system_detector.detect_system()
-            print(f"✅ System detection complete: {len(self.system_context)} items")
+            # Detect system, reusing the last result for an unchanged host
+            self._system_cache_key = self._system_fingerprint()
+            cached_context = _SYS_CTX_CACHE.get(self._system_cache_key) if self._system_cache_key else None
+            if cached_context is not None:
+                self.system_context = dict(cached_context)
+                logger.debug("✅ Using cached system context: %d items", len(self.system_context))
+            else:
+                self.system_context = self.system_detector.detect_system()
+                logger.debug("✅ System detection complete: %d items", len(self.system_context))
+                if self._system_cache_key and self.system_context:
+                    _SYS_CTX_CACHE[self._system_cache_key] = dict(self.system_context)
             
             # Initialize command generator
-            print("🤖 Initializing command generator...")
-            self.command_generator = CommandGenerator(
-                self.system_context, 
-                api_key=self.api_key
-            )
-            print("✅ Command generator initialized")
+            self.command_generator = _get_command_generator(self.system_context, self.api_key)
+            logger.debug("✅ Command generator initialized")
             
-            print("✅ Otium Agent initialized successfully!")
+            logger.debug("✅ Otium Agent initialized successfully!")
             return True
             
         except Exception as e:
-            print(f"❌ Failed to start agent: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("❌ Failed to start agent: %s", e)
+            if self._system_cache_key:
+                invalidate_system_context(self._system_cache_key[0])
             return False
     
+    def _system_fingerprint(self) -> Optional[Tuple[str, str]]:
+        """Fingerprint the connected host with one SSH call, or None if unavailable"""
+        info = self.ssh_manager.get_connection_info(self.connection_id) or {}
+        hostname = info.get('hostname')
+        if not hostname:
+            return None
+        
+        try:
+            result = self.ssh_manager.execute_command(self.connection_id, SYSTEM_FINGERPRINT_COMMAND)
+        except Exception:
+            return None
+        if not result.get('success'):
+            return None
+        
+        return hostname, hashlib.sha256(result.get('stdout', '').encode()).hexdigest()
+    
     def process_request(self, user_request: str) -> Dict[str, Any]:
         """Process a user request and execute commands"""
-        print(f"\n{'='*60}")
-        print(f"📝 Processing Request: {user_request}")
-        print(f"{'='*60}")
+        logger.debug("📝 Processing Request: %s", user_request)
         
         try:
             # Generate commands based on system context
-            print("🤖 Generating commands...")
             command_plan = self.command_generator.generate_commands(user_request)
             
             if not command_plan or 'steps' not in command_plan:
@@ -98,8 +209,7 @@ class Agent:
             
             # Basic safety check
             if self._is_dangerous_operation(command_plan):
-                print("🚨 DANGEROUS OPERATION DETECTED")
-                print("This operation requires explicit approval.")
+                logger.warning("🚨 Dangerous operation detected, explicit approval required")
                 return {
                     "success": False,
                     "error": "Dangerous operation requires approval",
@@ -107,8 +217,9 @@ class Agent:
                     "requires_approval": True
                 }
             
-            # Print plan
-            self._print_command_plan(command_plan)
+            # Print plan (only when debugging, it is several stdout writes)
+            if logger.isEnabledFor(logging.DEBUG):
+                self._print_command_plan(command_plan)
             
             # Execute commands
             execution_results = self._execute_commands(command_plan)
@@ -121,7 +232,7 @@ class Agent:
             }
             
         except Exception as e:
-            print(f"❌ Error processing request: {e}")
+            logger.error("❌ Error processing request: %s", e)
             return {
                 "success": False,
                 "error": str(e)
@@ -129,44 +240,36 @@ class Agent:
     
     def _is_dangerous_operation(self, command_plan: Dict[str, Any]) -> bool:
         """Basic safety check for dangerous operations"""
-        dangerous_patterns = [
-            'rm -rf /',
-            'rm -rf /etc',
-            'rm -rf /var',
-            'rm -rf /usr',
-            'rm -rf /boot',
-            'dd if=/dev/',
-            'mkfs',
-            'fdisk',
-            'systemctl stop sshd',
-            'systemctl disable sshd',
-            'iptables -F',
-            'firewall-cmd --reload'
-        ]
-        
         steps = command_plan.get('steps', [])
         for step in steps:
-            command = step.get('command', '').lower()
-            for pattern in dangerous_patterns:
-                if pattern in command:
-                    print(f"⚠️  Dangerous pattern detected: {pattern}")
-                    return True
+            command = step.get('command')
+            # Nothing to run for empty or skipped steps
+            if not command or step.get('skip'):
+                continue
+            match = self._DANGEROUS_RE.search(command)
+            if match:
+                logger.warning("⚠️  Dangerous pattern detected: %s", match.group(0))
+                return True
         
         return False
     
     def _print_command_plan(self, command_plan: Dict[str, Any]) -> None:
-        """Print command plan information"""
-        print(f"\n📋 Command Plan:")
-        print(f"   Intent: {command_plan.get('intent', 'Unknown')}")
-        print(f"   Action: {command_plan.get('action', 'Unknown')}")
-        print(f"   Risk Level: {command_plan.get('risk_level', 'Unknown')}")
-        print(f"   Explanation: {command_plan.get('explanation', 'No explanation')}")
-        print(f"   Steps: {len(command_plan.get('steps', []))}")
+        """Log command plan information as a single record"""
+        lines = [
+            "📋 Command Plan:",
+            f"   Intent: {command_plan.get('intent', 'Unknown')}",
+            f"   Action: {command_plan.get('action', 'Unknown')}",
+            f"   Risk Level: {command_plan.get('risk_level', 'Unknown')}",
+            f"   Explanation: {command_plan.get('explanation', 'No explanation')}",
+            f"   Steps: {len(command_plan.get('steps', []))}",
+        ]
         
-        # Print individual steps
+        # Individual steps
         for i, step in enumerate(command_plan.get('steps', []), 1):
-            print(f"   Step {i}: {step.get('command', 'No command')}")
-            print(f"      Description: {step.get('description', 'No description')}")
+            lines.append(f"   Step {i}: {step.get('command', 'No command')}")
+            lines.append(f"      Description: {step.get('description', 'No description')}")
+        
+        logger.debug("\n".join(lines))
     
     def _execute_commands(self, command_plan: Dict[str, Any]) -> Dict[str, Any]:
         """Execute commands from command plan"""
@@ -191,15 +294,16 @@ class Agent:
         """Cleanup resources"""
         if self.ssh_manager and self.connection_id:
             try:
-                print("🧹 Cleaning up SSH connection...")
+                logger.info("🧹 Cleaning up SSH connection...")
                 self.ssh_manager.disconnect(self.connection_id)
-                print("✅ SSH connection cleaned up")
+                logger.info("✅ SSH connection cleaned up")
             except Exception as e:
-                print(f"⚠️  Error cleaning up SSH connection: {e}")
+                logger.warning("⚠️  Error cleaning up SSH connection: %s", e)
 
 
 def main():
     """Main entry point"""
+    configure_logging(os.getenv("LOG_LEVEL", "INFO"))
     
     # Load environment variables from .env file
     try:
@@ -4,19 +4,37 @@ FastAPI Server for Otium AI Agent
 Integrates SSH manager, command executor, and agent for remote server management
 """
 
-from fastapi import FastAPI, HTTPException, Header
+from fastapi import FastAPI, HTTPException, Header, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel, Field
+import asyncio
+import copy
+import functools
+import hashlib
+import itertools
+import logging
 import os
+import sys
 import uuid
 import json
+import orjson
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar
+from dataclasses import dataclass, field
 from datetime import datetime
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Tuple
+
+from cachetools import TTLCache
 
 # Import our existing modules
-from agent import Agent
+from agent import Agent, configure_logging
 from ssh_manager import SSHManager
 from command_executor import CommandExecutor
+from command_generator import get_openai_client
+
+logger = logging.getLogger(__name__)
 
 # Configuration constants
 DEFAULT_PORT = 8000
@@ -26,10 +44,31 @@ DEFAULT_TIMEOUT = 10
 DEFAULT_COMMAND_TIMEOUT = 300
 DEFAULT_MAX_COMMANDS = 100
 DEFAULT_MAX_PRIORITY_LENGTH = 500
+BLOCKING_IO_WORKERS = 32  # Cap on threads used for SSH and OpenAI calls
+MAX_COMMANDS_PER_USER = DEFAULT_MAX_COMMANDS * 10
+COMMAND_RETENTION_SECONDS = 86400
+CONNECTION_SWEEP_INTERVAL_SECONDS = 60  # How often dead connections are pruned for all users
+PLAN_CACHE_SIZE = 1024
+PLAN_CACHE_TTL_SECONDS = 600
+PLAN_CACHE_RISK_LEVELS = ('low',)  # Only plans this safe are ever replayed from cache
+DEFAULT_MAX_CONCURRENCY = 200  # Per worker; requests beyond this get an immediate 503
+SERVER_BACKLOG = 2048
+SERVER_KEEP_ALIVE_SECONDS = 5
+GZIP_MINIMUM_SIZE = 512  # Smaller bodies aren't worth compressing
+RESPONSE_CACHE_SIZE = 1024
+RESPONSE_CACHE_TTL_SECONDS = 2  # Short enough that polling clients barely notice staleness
+# Per-user generations outlive any entry cached under them, then are dropped
+RESPONSE_CACHE_GENERATIONS_SIZE = RESPONSE_CACHE_SIZE * 4
+RESPONSE_CACHE_GENERATIONS_TTL_SECONDS = RESPONSE_CACHE_TTL_SECONDS * 30
+RESPONSE_CACHE_SKIP_PATHS = frozenset({"/api/commands/stream", "/api/health", "/api/health/live"})  # Streamed, global or trivial
 
 # Environment variables
 ENV_OPENAI_API_KEY = "OPENAI_API_KEY"
 ENV_DOTENV_PATH = ".env"
+ENV_DEV_MODE = "OTIUM_DEV"  # Set to 1 to run the launcher with auto-reload
+ENV_WEB_CONCURRENCY = "WEB_CONCURRENCY"
+ENV_USE_GUNICORN = "OTIUM_GUNICORN"  # Set to 1 to run the workers under gunicorn
+ENV_MAX_CONCURRENCY = "MAX_CONCURRENCY"
 
 # Status codes
 STATUS_CONNECTED = "connected"
@@ -40,7 +79,8 @@ STATUS_REJECTED = "rejected"
 STATUS_COMPLETED = "completed"
 
 # Priority levels
-VALID_PRIORITIES = ['low', 'normal', 'high', 'urgent']
+PRIORITY_LEVELS = ('low', 'normal', 'high', 'urgent')  # Display order for error messages
+VALID_PRIORITIES = frozenset(PRIORITY_LEVELS)
 
 # Error codes
 ERROR_CODES = {
@@ -55,6 +95,51 @@ ERROR_CODES = {
     'INVALID_STATUS': 'Invalid command status'
 }
 
+# Fixed error bodies, built once instead of per raise (treat as read-only)
+INVALID_PRIORITY_DETAIL = {
+    "error": f"Invalid priority. Must be one of: {', '.join(PRIORITY_LEVELS)}",
+    "error_code": "INVALID_PRIORITY"
+}
+CONNECTION_NOT_FOUND_DETAIL = {"error": ERROR_CODES['CONNECTION_NOT_FOUND'], "error_code": "CONNECTION_NOT_FOUND"}
+NO_CONNECTION_DETAIL = {"error": ERROR_CODES['NO_CONNECTION'], "error_code": "NO_CONNECTION"}
+COMMAND_NOT_FOUND_DETAIL = {"error": ERROR_CODES['COMMAND_NOT_FOUND'], "error_code": "COMMAND_NOT_FOUND"}
+
+# Static API description served by the root endpoint
+ROOT_PAYLOAD: Dict[str, Any] = {
+    "message": "Otium AI Agent API",
+    "version": "1.0.0",
+    "description": "AI-powered Linux system administration backend with SSH support",
+    "endpoints": {
+        "POST /api/connect": "Connect to SSH server",
+        "POST /api/disconnect": "Disconnect from server",
+        "GET /api/status": "Get connection status",
+        "POST /api/commands": "Submit natural language task",
+        "GET /api/commands": "List commands",
+        "GET /api/commands/stream": "Stream commands as NDJSON",
+        "GET /api/commands/{id}": "Get command details",
+        "POST /api/commands/{id}/approve": "Approve command execution",
+        "POST /api/commands/{id}/reject": "Reject command",
+        "GET /api/health": "Health check",
+        "GET /api/health/live": "Plain-text liveness probe for load balancers"
+    },
+    "usage": {
+        "1. Connect": "POST /api/connect with SSH credentials",
+        "2. Submit Task": "POST /api/commands with natural language request",
+        "3. Approve": "POST /api/commands/{id}/approve to execute",
+        "4. Monitor": "GET /api/commands/{id} for status and results"
+    }
+}
+
+# The root payload never changes, so it is serialized once at import
+ROOT_JSON_BYTES = orjson.dumps(ROOT_PAYLOAD)
+ROOT_ETAG = f'"{hashlib.sha256(ROOT_JSON_BYTES).hexdigest()}"'
+ROOT_CACHE_HEADERS = {"ETag": ROOT_ETAG, "Cache-Control": "public, max-age=3600, immutable"}
+ROOT_HEAD_HEADERS = {
+    **ROOT_CACHE_HEADERS,
+    "Content-Length": str(len(ROOT_JSON_BYTES)),
+    "Content-Type": "application/json"
+}
+
 # Load environment variables from .env file
 try:
     from dotenv import load_dotenv
@@ -65,13 +150,120 @@ except ImportError:
 except Exception as e:
     print(f"⚠️  Error loading .env file: {e}")
 
+# Environment snapshot taken once .env is loaded; none of this changes while the server runs
+OPENAI_API_KEY = os.getenv(ENV_OPENAI_API_KEY)
+ENVIRONMENT_INFO = {
+    'openai_api_key_set': bool(OPENAI_API_KEY),
+    'current_working_directory': os.getcwd(),
+    'env_file_exists': os.path.exists(ENV_DOTENV_PATH)
+}
+
 # Initialize FastAPI app
+# Handler convention: endpoints stay `async def` and must never block the loop.
+# Blocking SSH/paramiko and OpenAI calls go through run_blocking(), which uses
+# the bounded blocking_io_pool rather than the shared AnyIO threadpool. Cheap
+# handlers such as root() return prebuilt Responses inline.
 app = FastAPI(
     title="Otium AI Agent API",
     description="AI-powered Linux system administration backend with SSH support",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse  # orjson encodes the large command/status payloads much faster
 )
 
+# Request start time, formatted once per request by RequestTimeMiddleware
+request_now_iso: ContextVar[Optional[str]] = ContextVar("request_now_iso", default=None)
+
+
+def now_iso() -> str:
+    """ISO timestamp for the current request (falls back to the clock outside a request)"""
+    value = request_now_iso.get()
+    return value if value is not None else datetime.now().isoformat()
+
+
+class RequestTimeMiddleware:
+    """Plain ASGI middleware that stamps each HTTP request with its start time"""
+    
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        token = request_now_iso.set(datetime.now().isoformat())
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            request_now_iso.reset(token)
+
+
+app.add_middleware(RequestTimeMiddleware)
+
+
+class ResponseCacheMiddleware:
+    """Plain ASGI middleware that briefly caches successful per-user GET /api/ responses
+    
+    Any other method from a user bumps that user's generation, both before and after
+    the request runs, so cached entries from before the change are never served again.
+    Generations come from one global counter, so a user whose generation has expired
+    never gets back a value that older entries were cached under.
+    """
+    
+    def __init__(self, app):
+        self.app = app
+        self.cache = TTLCache(maxsize=RESPONSE_CACHE_SIZE, ttl=RESPONSE_CACHE_TTL_SECONDS)
+        self.generations = TTLCache(maxsize=RESPONSE_CACHE_GENERATIONS_SIZE, ttl=RESPONSE_CACHE_GENERATIONS_TTL_SECONDS)
+        self.generation_counter = itertools.count(1)
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith("/api/"):
+            await self.app(scope, receive, send)
+            return
+        
+        user_id = dict(scope["headers"]).get(b"user-id")
+        if scope["method"] != "GET":
+            self.generations[user_id] = next(self.generation_counter)
+            try:
+                await self.app(scope, receive, send)
+            finally:
+                self.generations[user_id] = next(self.generation_counter)
+            return
+        
+        if scope["path"] in RESPONSE_CACHE_SKIP_PATHS:
+            await self.app(scope, receive, send)
+            return
+        
+        key = (user_id, self.generations.get(user_id, 0), scope["path"], scope["query_string"])
+        cached = self.cache.get(key)
+        if cached is not None:
+            start_message, body = cached
+            # Outer middleware edits header lists in place, so each replay gets its own copy
+            await send({**start_message, "headers": list(start_message["headers"])})
+            await send({"type": "http.response.body", "body": body})
+            return
+        
+        start_message = None
+        chunks = []
+        
+        async def send_and_capture(message):
+            nonlocal start_message
+            if message["type"] == "http.response.start":
+                # Copied before outer middleware gets to edit the header list
+                start_message = {**message, "headers": list(message["headers"])}
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+                if not message.get("more_body", False) and start_message["status"] == 200:
+                    self.cache[key] = (start_message, b"".join(chunks))
+            await send(message)
+        
+        await self.app(scope, receive, send_and_capture)
+
+
+app.add_middleware(ResponseCacheMiddleware)
+
+# Added last so they wrap the cache: cached bodies are stored uncompressed and
+# CORS/gzip headers are worked out for each request, not replayed from the cache
+
 # CORS disabled for testing - allow all origins
 app.add_middleware(
     CORSMiddleware,
@@ -81,7 +273,21 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+class RootExemptGZipMiddleware(GZipMiddleware):
+    """Gzip everything except the root endpoint, whose HEAD route advertises the uncompressed headers"""
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"] == "/":
+            await self.app(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
+
+
+# Command listings and execution output are verbose text and compress well
+app.add_middleware(RootExemptGZipMiddleware, minimum_size=GZIP_MINIMUM_SIZE)
+
 # Pydantic models for request/response validation
+# Responses are assembled from server-side values, so handlers build them with model_construct()
 class SSHConnectionRequest(BaseModel):
     hostname: str = Field(..., description="Server hostname or IP address")
     username: str = Field(..., description="SSH username")
@@ -131,57 +337,120 @@ class HealthResponse(BaseModel):
     pending_commands: int
     active_executions: int
 
+class CommandStore(TTLCache):
+    """Per-user command history, bounded in size and age; evictions are reflected in storage_totals"""
+    
+    def __init__(self):
+        super().__init__(maxsize=MAX_COMMANDS_PER_USER, ttl=COMMAND_RETENTION_SECONDS)
+    
+    def popitem(self):
+        item = super().popitem()
+        storage_totals["commands"] -= 1
+        return item
+    
+    def expire(self, time=None):
+        # cachetools>=5.4 returns the expired (key, value) pairs
+        expired = super().expire(time)
+        storage_totals["commands"] -= len(expired)
+        return expired
+
+
+@dataclass
+class UserState:
+    """Everything held in memory for one user"""
+    ssh_manager: SSHManager = field(default_factory=SSHManager)
+    connections: Dict[str, Dict[str, Any]] = field(default_factory=dict)  # connection_id -> connection_data
+    agents: Dict[str, Agent] = field(default_factory=dict)  # connection_id -> Agent
+    commands: CommandStore = field(default_factory=CommandStore)  # command_id -> command_data, oldest first
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)  # Guards check-then-mutate sequences that await
+
+
 # User-scoped storage for multi-user support
-user_agents: Dict[str, Dict[str, Agent]] = {}  # user_id -> {connection_id -> Agent}
-user_connections: Dict[str, Dict[str, Any]] = {}  # user_id -> {connection_id -> connection_data}
-user_commands: Dict[str, Dict[str, Any]] = {}  # user_id -> {command_id -> command_data}
-user_ssh_managers: Dict[str, SSHManager] = {}  # user_id -> SSHManager
+user_states: Dict[str, UserState] = {}  # user_id -> UserState
+
+# Running totals across all users, kept in step with the stores above so health checks don't rescan them
+storage_totals = {"connections": 0, "commands": 0}
+
+# Recently generated plans keyed by (user, host, normalized request)
+plan_cache: TTLCache = TTLCache(maxsize=PLAN_CACHE_SIZE, ttl=PLAN_CACHE_TTL_SECONDS)
+
+# Bounded pool for blocking SSH/OpenAI calls so thread count stays flat under load
+blocking_io_pool = ThreadPoolExecutor(max_workers=BLOCKING_IO_WORKERS, thread_name_prefix="otium-io")
+
+# Background task pruning dead connections (started with the app)
+connection_sweeper: Optional[asyncio.Task] = None
+
+
+async def run_blocking(func, *args, **kwargs):
+    """Run a blocking call on the bounded I/O pool"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(blocking_io_pool, functools.partial(func, *args, **kwargs))
+
+
+def get_state(user_id: str) -> UserState:
+    """Return the user's state, creating it on first use"""
+    state = user_states.get(user_id)
+    if state is None:
+        state = user_states[user_id] = UserState()
+    return state
+
+
+@app.on_event("startup")
+async def startup_event():
+    """Warm shared clients and start background maintenance"""
+    global connection_sweeper
+    # Per serving process, so each gunicorn worker starts its own log listener thread
+    configure_logging(os.getenv("LOG_LEVEL", "INFO"))
+    # Build the shared OpenAI client up front so the first connect doesn't pay for it
+    if OPENAI_API_KEY:
+        get_openai_client(OPENAI_API_KEY)
+    connection_sweeper = asyncio.create_task(connection_sweep_task())
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop background maintenance and release the blocking I/O pool"""
+    if connection_sweeper:
+        connection_sweeper.cancel()
+    blocking_io_pool.shutdown(wait=False)
 
 
 def get_environment_info() -> Dict[str, Any]:
     """Get environment information for debugging"""
-    return {
-        'openai_api_key_set': bool(os.getenv(ENV_OPENAI_API_KEY)),
-        'openai_api_key_value': os.getenv(ENV_OPENAI_API_KEY, 'NOT_SET')[:20] if os.getenv(ENV_OPENAI_API_KEY) else 'NOT_SET',
-        'current_working_directory': os.getcwd(),
-        'env_file_exists': os.path.exists(ENV_DOTENV_PATH)
-    }
+    return ENVIRONMENT_INFO
 
 
 def validate_priority(priority: str) -> None:
     """Validate task priority level"""
     if priority not in VALID_PRIORITIES:
-        raise HTTPException(
-            status_code=400,
-            detail={
-                "error": f"Invalid priority. Must be one of: {', '.join(VALID_PRIORITIES)}",
-                "error_code": "INVALID_PRIORITY"
-            }
-        )
+        raise HTTPException(status_code=400, detail=INVALID_PRIORITY_DETAIL)
 
 
-def validate_connection_exists(user_id: str, connection_id: str) -> None:
-    """Validate that a connection exists for this user"""
-    if user_id not in user_connections or connection_id not in user_connections[user_id]:
-        raise HTTPException(
-            status_code=404,
-            detail={
-                "error": ERROR_CODES['CONNECTION_NOT_FOUND'],
-                "error_code": "CONNECTION_NOT_FOUND"
-            }
-        )
+def require_connection(user_id: str, connection_id: str) -> Dict[str, Any]:
+    """Return this user's connection info, or raise 404"""
+    state = user_states.get(user_id)
+    connection_info = state.connections.get(connection_id) if state else None
+    if connection_info is None:
+        raise HTTPException(status_code=404, detail=CONNECTION_NOT_FOUND_DETAIL)
+    return connection_info
 
 
-def validate_agent_initialized(user_id: str, connection_id: str) -> None:
-    """Validate that the agent is initialized for this user and connection"""
-    if user_id not in user_agents or connection_id not in user_agents[user_id]:
-        raise HTTPException(
-            status_code=400,
-            detail={
-                "error": ERROR_CODES['NO_CONNECTION'],
-                "error_code": "NO_CONNECTION"
-            }
-        )
+def require_agent(user_id: str, connection_id: str) -> Agent:
+    """Return the agent for this user and connection, or raise 400"""
+    state = user_states.get(user_id)
+    agent = state.agents.get(connection_id) if state else None
+    if agent is None:
+        raise HTTPException(status_code=400, detail=NO_CONNECTION_DETAIL)
+    return agent
+
+
+def require_command(user_id: str, command_id: str) -> Dict[str, Any]:
+    """Return this user's command data, or raise 404"""
+    state = user_states.get(user_id)
+    command_data = state.commands.get(command_id) if state else None
+    if command_data is None:
+        raise HTTPException(status_code=404, detail=COMMAND_NOT_FOUND_DETAIL)
+    return command_data
 
 
 def create_connection_info(user_id: str, hostname: str, username: str, port: int) -> Dict[str, Any]:
@@ -191,7 +460,7 @@ def create_connection_info(user_id: str, hostname: str, username: str, port: int
         "hostname": hostname,
         "username": username,
         "port": port,
-        "connected_at": datetime.now().isoformat(),
+        "connected_at": now_iso(),
         "status": STATUS_CONNECTED
     }
 
@@ -210,7 +479,7 @@ def create_command_data(user_id: str, task_request: TaskRequest, command_plan: D
         "risk_level": command_plan.get('risk_level', 'Unknown'),
         "explanation": command_plan.get('explanation', 'No explanation'),
         "status": STATUS_PENDING_APPROVAL,
-        "created_at": datetime.now().isoformat(),
+        "created_at": now_iso(),
         "approved_at": None,
         "executed_at": None,
         "completed_at": None
@@ -218,61 +487,115 @@ def create_command_data(user_id: str, task_request: TaskRequest, command_plan: D
 
 
 def convert_command_steps(command_plan: Dict[str, Any]) -> List[CommandStep]:
-    """Convert command plan steps to Pydantic models"""
-    command_steps = []
-    for i, step in enumerate(command_plan['steps']):
-        command_steps.append(CommandStep(
-            step=i + 1,
+    """Convert command plan steps to Pydantic models (skipping validation; fields are built here)"""
+    return [
+        CommandStep.model_construct(
+            step=i,
             command=step.get('command', ''),
             explanation=step.get('explanation', ''),
             risk_level=step.get('risk_level', 'Unknown'),
             estimated_time=step.get('estimated_time')
-        ))
-    return command_steps
+        )
+        for i, step in enumerate(command_plan['steps'], 1)
+    ]
 
 
-def cleanup_dead_connections() -> None:
-    """Remove dead connections from all users"""
-    for user_id in list(user_connections.keys()):
-        dead_connections = []
-        ssh_manager = user_ssh_managers.get(user_id)
+def plan_cache_key(user_id: str, connection_id: str, agent: Agent, request: str) -> Tuple[str, Any, str]:
+    """Cache key for a request on a host; equivalent phrasings differing only in case/spacing share it"""
+    normalized = " ".join(request.lower().split()).rstrip(".!?")
+    host_key = getattr(agent, '_system_cache_key', None) or connection_id
+    return user_id, host_key, hashlib.sha256(normalized.encode()).hexdigest()
+
+
+def iter_user_commands(state: UserState, status: Optional[str], connection_id: Optional[str], limit: int):
+    """Yield a user's commands newest first, applying filters and stopping at the limit"""
+    # Commands are stored in creation order, so walking backwards yields newest first
+    # and we can stop as soon as the limit is reached
+    remaining = limit
+    for cmd_data in reversed(list(state.commands.values())):
+        if remaining <= 0:
+            return
         
-        if not ssh_manager:
+        # Apply status filter
+        if status and cmd_data['status'] != status:
             continue
-            
-        for conn_id in list(user_connections[user_id].keys()):
-            if not ssh_manager.is_connection_alive(conn_id):
-                dead_connections.append(conn_id)
         
-        for conn_id in dead_connections:
-            user_connections[user_id].pop(conn_id, None)
-            if user_id in user_agents and conn_id in user_agents[user_id]:
-                user_agents[user_id].pop(conn_id, None)
+        # Apply connection filter
+        if connection_id and cmd_data['connection_id'] != connection_id:
+            continue
+        
+        remaining -= 1
+        yield cmd_data
+
+
+def cleanup_dead_connections() -> None:
+    """Remove dead connections from all users"""
+    for state in list(user_states.values()):
+        cleanup_user_connections(state)
+
+
+def cleanup_user_connections(state: UserState) -> None:
+    """Remove one user's dead connections"""
+    dead_connections = [
+        conn_id for conn_id in state.connections
+        if not state.ssh_manager.is_connection_alive(conn_id)
+    ]
+    
+    for conn_id in dead_connections:
+        forget_connection(state, conn_id)
+
+
+async def connection_sweep_task():
+    """Periodically prune dead connections so idle users don't hold agents for dropped sessions"""
+    while True:
+        await asyncio.sleep(CONNECTION_SWEEP_INTERVAL_SECONDS)
+        try:
+            cleanup_dead_connections()
+        except Exception as e:
+            print(f"⚠️  Connection sweep failed: {e}")
+
+
+def forget_connection(state: UserState, connection_id: str) -> Optional[Dict[str, Any]]:
+    """Drop a connection and its agent from memory, returning the connection info if it was stored"""
+    connection_info = state.connections.pop(connection_id, None)
+    if connection_info is not None:
+        storage_totals["connections"] -= 1
+    state.agents.pop(connection_id, None)
+    return connection_info
 
 
 @app.get("/api/health", response_model=HealthResponse)
 async def health_check():
     """Health check endpoint"""
-    total_connections = sum(len(connections) for connections in user_connections.values())
-    total_pending = sum(len(commands) for commands in user_commands.values())
-    
-    return HealthResponse(
+    # Commands past their TTL are only dropped on access; expire them so the count is current
+    for state in user_states.values():
+        state.commands.expire()
+    return HealthResponse.model_construct(
         status="healthy",
-        timestamp=datetime.now().isoformat(),
+        timestamp=now_iso(),
         version="1.0.0",
-        ssh_connections=total_connections,
-        pending_commands=total_pending,
+        ssh_connections=storage_totals["connections"],
+        pending_commands=storage_totals["commands"],
         active_executions=0  # Will implement later
     )
 
 
+async def liveness_probe(request: Request) -> Response:
+    """Liveness probe: a plain-text 'ok' with no JSON encoding"""
+    return PlainTextResponse("ok")
+
+
+# Plain Starlette route (GET and HEAD) so load balancer probes skip FastAPI's request handling
+app.add_route("/api/health/live", liveness_probe, methods=["GET"])
+
+
 @app.post("/api/connect", response_model=SSHConnectionResponse)
 async def connect_to_server(request: SSHConnectionRequest, user_id: str = Header("X-User-ID")):
     """Connect to a server via SSH and store the connection"""
     try:
         # Validate user_id
         if not user_id:
-            return SSHConnectionResponse(
+            return SSHConnectionResponse.model_construct(
                 success=False,
                 message="User ID required",
                 hostname=request.hostname,
@@ -281,18 +604,11 @@ async def connect_to_server(request: SSHConnectionRequest, user_id: str = Header
             )
         
         # Initialize user storage if needed
-        if user_id not in user_ssh_managers:
-            user_ssh_managers[user_id] = SSHManager()
-        if user_id not in user_connections:
-            user_connections[user_id] = {}
-        if user_id not in user_agents:
-            user_agents[user_id] = {}
-        
-        # Get user's SSH manager
-        ssh_manager = user_ssh_managers[user_id]
+        state = get_state(user_id)
         
-        # Attempt SSH connection and storage
-        connection_result = ssh_manager.connect_and_store(
+        # Attempt SSH connection and storage (blocking paramiko handshake, run off the event loop)
+        connection_result = await run_blocking(
+            state.ssh_manager.connect_and_store,
             hostname=request.hostname,
             username=request.username,
             password=request.password,
@@ -300,7 +616,7 @@ async def connect_to_server(request: SSHConnectionRequest, user_id: str = Header
         )
         
         if not connection_result['success']:
-            return SSHConnectionResponse(
+            return SSHConnectionResponse.model_construct(
                 success=False,
                 message=connection_result['error'],
                 hostname=request.hostname,
@@ -310,14 +626,15 @@ async def connect_to_server(request: SSHConnectionRequest, user_id: str = Header
         
         # Store connection info
         connection_id = connection_result['connection_id']
-        user_connections[user_id][connection_id] = create_connection_info(
+        state.connections[connection_id] = create_connection_info(
             user_id, request.hostname, request.username, request.port
         )
+        storage_totals["connections"] += 1
         
         # Initialize agent for this specific connection
         agent = await initialize_agent(user_id, connection_id)
         if not agent:
-            return SSHConnectionResponse(
+            return SSHConnectionResponse.model_construct(
                 success=False,
                 message="Failed to initialize AI agent",
                 hostname=request.hostname,
@@ -325,7 +642,7 @@ async def connect_to_server(request: SSHConnectionRequest, user_id: str = Header
                 port=request.port
             )
         
-        return SSHConnectionResponse(
+        return SSHConnectionResponse.model_construct(
             success=True,
             connection_id=connection_id,
             message="SSH connection established successfully",
@@ -335,7 +652,7 @@ async def connect_to_server(request: SSHConnectionRequest, user_id: str = Header
         )
         
     except Exception as e:
-        return SSHConnectionResponse(
+        return SSHConnectionResponse.model_construct(
             success=False,
             message=f"Connection failed: {str(e)}",
             hostname=request.hostname,
@@ -347,38 +664,34 @@ async def connect_to_server(request: SSHConnectionRequest, user_id: str = Header
 async def initialize_agent(user_id: str, connection_id: str) -> Optional[Agent]:
     """Initialize a new agent for a specific user and connection"""
     try:
-        print(f"🔧 Initializing new agent for user {user_id}, connection {connection_id}...")
-        env_info = get_environment_info()
-        print(f"🔍 Debug: Agent creation parameters:")
-        print(f"   - user_id: {user_id}")
-        print(f"   - api_key: {'SET' if env_info['openai_api_key_set'] else 'NOT_SET'}")
-        print(f"   - ssh_manager: {'SET' if user_ssh_managers.get(user_id) else 'NOT_SET'}")
-        print(f"   - connection_id: {connection_id}")
+        logger.debug(
+            "Initializing agent user=%s connection=%s api_key_set=%s",
+            user_id, connection_id, get_environment_info()['openai_api_key_set']
+        )
         
         # Get user's SSH manager
-        ssh_manager = user_ssh_managers[user_id]
+        state = user_states[user_id]
         
         agent = Agent(
-            api_key=os.getenv(ENV_OPENAI_API_KEY),
-            ssh_manager=ssh_manager,
+            api_key=OPENAI_API_KEY,
+            ssh_manager=state.ssh_manager,
             connection_id=connection_id
         )
-        print("Agent created successfully")
         
         # Start the agent in SSH mode
-        print("Starting agent...")
-        if not agent.start():
-            print("Failed to start agent in SSH mode")
+        # System detection runs several SSH round-trips
+        if not await run_blocking(agent.start):
+            logger.warning("Failed to start agent in SSH mode for connection %s", connection_id)
             return None
-        print("Agent started successfully")
+        logger.debug("Agent started for connection %s", connection_id)
         
         # Store agent for this user and connection
-        user_agents[user_id][connection_id] = agent
+        state.agents[connection_id] = agent
         
         return agent
         
     except Exception as e:
-        print(f"Error creating agent: {e}")
+        logger.error("Error creating agent: %s", e)
         return None
 
 
@@ -390,26 +703,24 @@ async def disconnect_from_server(disconnect_request: CommandApproval, user_id: s
     """Disconnect from a server"""
     try:
         connection_id = disconnect_request.command_id
-        validate_connection_exists(user_id, connection_id)
-        
-        # Get user's SSH manager
-        ssh_manager = user_ssh_managers[user_id]
-        
-        # Close SSH connection
-        ssh_manager.disconnect(connection_id)
-        
-        # Remove from user's connections
-        connection_info = user_connections[user_id].pop(connection_id)
+        require_connection(user_id, connection_id)
         
-        # Remove agent for this connection
-        if user_id in user_agents and connection_id in user_agents[user_id]:
-            user_agents[user_id].pop(connection_id, None)
+        # Held across the SSH close so a concurrent disconnect can't pass validation for a closing connection
+        state = user_states[user_id]
+        async with state.lock:
+            require_connection(user_id, connection_id)
+            
+            # Close SSH connection
+            await run_blocking(state.ssh_manager.disconnect, connection_id)
+            
+            # Remove from user's connections along with its agent
+            connection_info = forget_connection(state, connection_id)
         
         return {
             "connection_id": connection_id,
             "status": STATUS_DISCONNECTED,
             "hostname": connection_info["hostname"],
-            "disconnected_at": datetime.now().isoformat()
+            "disconnected_at": now_iso()
         }
         
     except HTTPException:
@@ -429,40 +740,28 @@ async def disconnect_from_server(disconnect_request: CommandApproval, user_id: s
 async def get_connection_status(user_id: str = Header("X-User-ID")):
     """Get status of all connections for this user"""
     try:
-        # Clean up dead connections first
-        cleanup_dead_connections()
-        
         # Only return connections for this user
-        if user_id not in user_connections:
+        state = user_states.get(user_id)
+        if state is None:
             return {
                 "connections": {},
                 "total_connections": 0,
-                "timestamp": datetime.now().isoformat()
+                "timestamp": now_iso()
             }
         
-        # Get connection statuses for this user
-        connection_statuses = {}
-        ssh_manager = user_ssh_managers.get(user_id)
+        # Other users are handled by the background sweep; liveness is a local transport check
+        cleanup_user_connections(state)
         
-        for conn_id, conn_info in user_connections[user_id].items():
-            # Check if SSH connection is still alive
-            is_alive = ssh_manager.is_connection_alive(conn_id) if ssh_manager else False
-            conn_info_copy = conn_info.copy()
-            conn_info_copy['alive'] = is_alive
-            
-            if not is_alive:
-                conn_info_copy['status'] = STATUS_DISCONNECTED
-                # Remove dead connections
-                user_connections[user_id].pop(conn_id, None)
-                if user_id in user_agents and conn_id in user_agents[user_id]:
-                    user_agents[user_id].pop(conn_id, None)
-            else:
-                connection_statuses[conn_id] = conn_info_copy
+        # Dead connections were dropped above, so everything left is alive
+        connection_statuses = {
+            conn_id: {**conn_info, 'alive': True}
+            for conn_id, conn_info in state.connections.items()
+        }
         
         return {
             "connections": connection_statuses,
             "total_connections": len(connection_statuses),
-            "timestamp": datetime.now().isoformat()
+            "timestamp": now_iso()
         }
         
     except Exception as e:
@@ -491,13 +790,13 @@ async def submit_task(task_request: TaskRequest, user_id: str = Header("X-User-I
             raise HTTPException(status_code=400, detail={"error": "User ID required"})
         
         # Validate connection exists for this user
-        validate_connection_exists(user_id, task_request.connection_id)
+        require_connection(user_id, task_request.connection_id)
         
         # Validate priority
         validate_priority(task_request.priority)
         
         # Check if agent is initialized for this user and connection
-        validate_agent_initialized(user_id, task_request.connection_id)
+        require_agent(user_id, task_request.connection_id)
         
         # Check agent status
         await check_agent_status(user_id, task_request.connection_id)
@@ -506,20 +805,17 @@ async def submit_task(task_request: TaskRequest, user_id: str = Header("X-User-I
         command_plan = await generate_command_plan(user_id, task_request.connection_id, task_request.request)
         
         # Create command data
-        command_id = str(uuid.uuid4())
+        command_id = uuid.uuid4().hex  # Opaque id; hex skips the hyphenated formatting
         command_data = create_command_data(user_id, task_request, command_plan, command_id)
         
-        # Initialize user command storage if needed
-        if user_id not in user_commands:
-            user_commands[user_id] = {}
-        
         # Store in user's commands
-        user_commands[user_id][command_id] = command_data
+        user_states[user_id].commands[command_id] = command_data
+        storage_totals["commands"] += 1
         
         # Convert command steps to Pydantic models
         command_steps = convert_command_steps(command_plan)
         
-        return TaskResponse(
+        return TaskResponse.model_construct(
             command_id=command_id,
             status=STATUS_PENDING_APPROVAL,
             generated_commands=command_steps,
@@ -547,26 +843,33 @@ async def submit_task(task_request: TaskRequest, user_id: str = Header("X-User-I
 
 async def check_agent_status(user_id: str, connection_id: str) -> None:
     """Check agent status and components for specific user and connection"""
-    print(f"🔍 Agent status check for user {user_id}, connection {connection_id}:")
+    if not logger.isEnabledFor(logging.DEBUG):
+        return
     
-    if user_id not in user_agents or connection_id not in user_agents[user_id]:
-        print("❌ Agent not found for this user and connection")
+    state = user_states.get(user_id)
+    agent = state.agents.get(connection_id) if state else None
+    if agent is None:
+        logger.debug("Agent not found for user=%s connection=%s", user_id, connection_id)
         return
     
-    agent = user_agents[user_id][connection_id]
-    print(f"   - Agent exists: {agent is not None}")
-    print(f"   - Command generator: {hasattr(agent, 'command_generator')}")
-    print(f"   - Command generator initialized: {agent.command_generator is not None if hasattr(agent, 'command_generator') else False}")
-    print(f"   - System context: {len(agent.system_context) if hasattr(agent, 'command_generator') else 0} items")
+    has_generator = hasattr(agent, 'command_generator')
+    logger.debug(
+        "Agent status user=%s connection=%s generator=%s initialized=%s context_items=%d",
+        user_id, connection_id, has_generator,
+        has_generator and agent.command_generator is not None,
+        len(agent.system_context) if has_generator else 0
+    )
 
 
 async def generate_command_plan(user_id: str, connection_id: str, request: str) -> Dict[str, Any]:
     """Generate command plan using the agent for specific user and connection"""
-    print(f"🤖 Generating commands for user {user_id}, connection {connection_id}, request: {request}")
+    logger.debug("Generating commands user=%s connection=%s request=%r", user_id, connection_id, request)
     
     # Get agent for this user and connection
-    if user_id not in user_agents or connection_id not in user_agents[user_id]:
-        print("❌ Agent not found for this user and connection")
+    state = user_states.get(user_id)
+    agent = state.agents.get(connection_id) if state else None
+    if agent is None:
+        logger.warning("Agent not found for user=%s connection=%s", user_id, connection_id)
         raise HTTPException(
             status_code=500,
             detail={
@@ -576,11 +879,9 @@ async def generate_command_plan(user_id: str, connection_id: str, request: str)
             }
         )
     
-    agent = user_agents[user_id][connection_id]
-    
     # Check if command generator is available
     if not hasattr(agent, 'command_generator') or agent.command_generator is None:
-        print("❌ Command generator not initialized")
+        logger.warning("Command generator not initialized for connection %s", connection_id)
         raise HTTPException(
             status_code=500,
             detail={
@@ -590,10 +891,16 @@ async def generate_command_plan(user_id: str, connection_id: str, request: str)
             }
         )
     
+    cache_key = plan_cache_key(user_id, connection_id, agent, request)
+    cached_plan = plan_cache.get(cache_key)
+    if cached_plan is not None:
+        logger.debug("Using cached command plan")
+        return copy.deepcopy(cached_plan)
+    
     try:
-        command_plan = agent.command_generator.generate_commands(request)
+        command_plan = await run_blocking(agent.command_generator.generate_commands, request)
     except Exception as e:
-        print(f"❌ Command generation failed: {e}")
+        logger.error("Command generation failed: %s", e)
         raise HTTPException(
             status_code=500,
             detail={
@@ -613,12 +920,39 @@ async def generate_command_plan(user_id: str, connection_id: str, request: str)
             }
         )
     
+    if command_plan.get('risk_level') in PLAN_CACHE_RISK_LEVELS:
+        plan_cache[cache_key] = copy.deepcopy(command_plan)
+    
     return command_plan
 
 
 # Safety assessment removed in Phase 1 - handled by basic agent checks
 
 
+# Registered before /api/commands/{command_id} so "stream" isn't taken as a command id
+@app.get("/api/commands/stream")
+async def stream_commands(
+    user_id: str = Header("X-User-ID"),
+    status: Optional[str] = None,
+    connection_id: Optional[str] = None,
+    limit: int = 50
+):
+    """Stream commands newest first as NDJSON, one command per line"""
+    if not user_id:
+        raise HTTPException(status_code=400, detail={"error": "User ID required"})
+    
+    limit = min(limit, DEFAULT_MAX_COMMANDS)
+    state = user_states.get(user_id)
+    
+    async def command_lines():
+        if state is None:
+            return
+        for cmd_data in iter_user_commands(state, status, connection_id, limit):
+            yield orjson.dumps(cmd_data) + b"\n"
+    
+    return StreamingResponse(command_lines(), media_type="application/x-ndjson")
+
+
 @app.get("/api/commands/{command_id}")
 async def get_command_status(command_id: str, user_id: str = Header("X-User-ID")):
     """Get status and details of a specific command"""
@@ -628,16 +962,7 @@ async def get_command_status(command_id: str, user_id: str = Header("X-User-ID")
             raise HTTPException(status_code=400, detail={"error": "User ID required"})
         
         # Check if user has this command
-        if user_id not in user_commands or command_id not in user_commands[user_id]:
-            raise HTTPException(
-                status_code=404,
-                detail={
-                    "error": ERROR_CODES['COMMAND_NOT_FOUND'],
-                    "error_code": "COMMAND_NOT_FOUND"
-                }
-            )
-        
-        return user_commands[user_id][command_id]
+        return require_command(user_id, command_id)
         
     except HTTPException:
         raise
@@ -661,16 +986,7 @@ async def approve_command(command_id: str, user_id: str = Header("X-User-ID")):
             raise HTTPException(status_code=400, detail={"error": "User ID required"})
         
         # Check if user has this command
-        if user_id not in user_commands or command_id not in user_commands[user_id]:
-            raise HTTPException(
-                status_code=404,
-                detail={
-                    "error": ERROR_CODES['COMMAND_NOT_FOUND'],
-                    "error_code": "COMMAND_NOT_FOUND"
-                }
-            )
-        
-        command_data = user_commands[user_id][command_id]
+        command_data = require_command(user_id, command_id)
         
         if command_data['status'] != STATUS_PENDING_APPROVAL:
             raise HTTPException(
@@ -683,16 +999,17 @@ async def approve_command(command_id: str, user_id: str = Header("X-User-ID")):
         
         # Update command status
         command_data['status'] = STATUS_APPROVED
-        command_data['approved_at'] = datetime.now().isoformat()
+        command_data['approved_at'] = now_iso()
         
         # Execute the command using the agent's command executor
         connection_id = command_data['connection_id']
-        if user_id in user_agents and connection_id in user_agents[user_id]:
-            agent = user_agents[user_id][connection_id]
+        agent = user_states[user_id].agents.get(connection_id)
+        if agent is not None:
             if hasattr(agent, 'command_executor'):
                 # Set the connection ID for this execution
                 agent.command_executor.set_connection_id(connection_id)
-                execution_result = agent.command_executor.execute_steps(
+                execution_result = await run_blocking(
+                    agent.command_executor.execute_steps,
                     command_data['generated_commands']
                 )
             else:
@@ -714,8 +1031,9 @@ async def approve_command(command_id: str, user_id: str = Header("X-User-ID")):
         
         # Update command with execution results
         command_data['status'] = STATUS_COMPLETED
-        command_data['executed_at'] = datetime.now().isoformat()
-        command_data['completed_at'] = datetime.now().isoformat()
+        finished_at = datetime.now().isoformat()  # Real time, not request start: execution takes a while
+        command_data['executed_at'] = finished_at
+        command_data['completed_at'] = finished_at
         command_data['execution_results'] = execution_result
         
         return {
@@ -747,16 +1065,7 @@ async def reject_command(command_id: str, user_id: str = Header("X-User-ID")):
             raise HTTPException(status_code=400, detail={"error": "User ID required"})
         
         # Check if user has this command
-        if user_id not in user_commands or command_id not in user_commands[user_id]:
-            raise HTTPException(
-                status_code=404,
-                detail={
-                    "error": ERROR_CODES['COMMAND_NOT_FOUND'],
-                    "error_code": "COMMAND_NOT_FOUND"
-                }
-            )
-        
-        command_data = user_commands[user_id][command_id]
+        command_data = require_command(user_id, command_id)
         
         if command_data['status'] != STATUS_PENDING_APPROVAL:
             raise HTTPException(
@@ -769,7 +1078,7 @@ async def reject_command(command_id: str, user_id: str = Header("X-User-ID")):
         
         # Update command status
         command_data['status'] = STATUS_REJECTED
-        command_data['rejected_at'] = datetime.now().isoformat()
+        command_data['rejected_at'] = now_iso()
         
         return {
             "command_id": command_id,
@@ -807,7 +1116,8 @@ async def list_commands(
         limit = min(limit, DEFAULT_MAX_COMMANDS)
         
         # Only return commands for this user
-        if user_id not in user_commands:
+        state = user_states.get(user_id)
+        if state is None:
             return {
                 "commands": [],
                 "total": 0,
@@ -818,24 +1128,7 @@ async def list_commands(
                 }
             }
         
-        # Filter commands for this user
-        filtered_commands = []
-        for cmd_id, cmd_data in user_commands[user_id].items():
-            # Apply status filter
-            if status and cmd_data['status'] != status:
-                continue
-            
-            # Apply connection filter
-            if connection_id and cmd_data['connection_id'] != connection_id:
-                continue
-            
-            filtered_commands.append(cmd_data)
-        
-        # Sort by creation date (newest first)
-        filtered_commands.sort(key=lambda x: x['created_at'], reverse=True)
-        
-        # Apply limit
-        filtered_commands = filtered_commands[:limit]
+        filtered_commands = list(iter_user_commands(state, status, connection_id, limit))
         
         return {
             "commands": filtered_commands,
@@ -858,47 +1151,79 @@ async def list_commands(
         )
 
 
-@app.get("/")
-async def root():
+async def root(request: Request) -> Response:
     """Root endpoint with API information"""
-    return {
-        "message": "Otium AI Agent API",
-        "version": "1.0.0",
-        "description": "AI-powered Linux system administration backend with SSH support",
-        "endpoints": {
-            "POST /api/connect": "Connect to SSH server",
-            "POST /api/disconnect": "Disconnect from server",
-            "GET /api/status": "Get connection status",
-            "POST /api/commands": "Submit natural language task",
-            "GET /api/commands": "List commands",
-            "GET /api/commands/{id}": "Get command details",
-            "POST /api/commands/{id}/approve": "Approve command execution",
-            "POST /api/commands/{id}/reject": "Reject command",
-            "GET /api/health": "Health check"
-        },
-        "usage": {
-            "1. Connect": "POST /api/connect with SSH credentials",
-            "2. Submit Task": "POST /api/commands with natural language request",
-            "3. Approve": "POST /api/commands/{id}/approve to execute",
-            "4. Monitor": "GET /api/commands/{id} for status and results"
-        }
-    }
+    if request.headers.get("if-none-match") == ROOT_ETAG:
+        return Response(status_code=304, headers=ROOT_CACHE_HEADERS)
+    return Response(content=ROOT_JSON_BYTES, media_type="application/json", headers=ROOT_CACHE_HEADERS)
+
+
+async def root_head(request: Request) -> Response:
+    """Headers of the root endpoint, without building a body"""
+    return Response(headers=ROOT_HEAD_HEADERS)
+
+
+# Plain Starlette routes: the static body needs no dependency solving or response serialization.
+# HEAD is registered first, otherwise the GET route would also answer it by running root().
+app.add_route("/", root_head, methods=["HEAD"])
+app.add_route("/", root, methods=["GET"])
 
 
 if __name__ == "__main__":
     import uvicorn
     
-    print("🚀 Starting Otium AI Agent API Server...")
-    print("📡 API endpoints available at http://localhost:8000")
-    print("🔗 Health check: GET /api/health")
-    print("🔌 Connect to server: POST /api/connect")
-    print("📝 Submit task: POST /api/commands")
-    print("📚 API documentation: http://localhost:8000/docs")
+    # One write, and only for an interactive terminal (not under systemd/docker)
+    if sys.stdout.isatty():
+        sys.stdout.write(
+            "🚀 Starting Otium AI Agent API Server...\n"
+            f"📡 API endpoints available at http://localhost:{DEFAULT_PORT}\n"
+            "🔗 Health check: GET /api/health\n"
+            "🔌 Connect to server: POST /api/connect\n"
+            "📝 Submit task: POST /api/commands\n"
+            f"📚 API documentation: http://localhost:{DEFAULT_PORT}/docs\n"
+        )
     
-    uvicorn.run(
-        "api_server:app",
-        host=DEFAULT_HOST,
-        port=DEFAULT_PORT,
-        reload=True,
-        log_level="info"
-    )
+    if os.getenv(ENV_DEV_MODE) == "1":
+        uvicorn.run(
+            "api_server:app",
+            host=DEFAULT_HOST,
+            port=DEFAULT_PORT,
+            reload=True,
+            log_level="info"
+        )
+    elif os.getenv(ENV_USE_GUNICORN) == "1":
+        # gunicorn restarts crashed workers; --preload imports the app once before forking
+        os.execvp("gunicorn", [
+            "gunicorn", "api_server:app",
+            "-k", "uvicorn.workers.UvicornWorker",
+            "-w", os.getenv(ENV_WEB_CONCURRENCY, "1"),
+            "-b", f"{DEFAULT_HOST}:{DEFAULT_PORT}",
+            "--backlog", str(SERVER_BACKLOG),
+            "--keep-alive", str(SERVER_KEEP_ALIVE_SECONDS),
+            "--preload"
+        ])
+    else:
+        try:
+            import uvloop  # noqa: F401 - shipped with uvicorn[standard]
+            loop = "uvloop"
+        except ImportError:
+            loop = "asyncio"
+        try:
+            import httptools  # noqa: F401 - shipped with uvicorn[standard]
+            http = "httptools"
+        except ImportError:
+            http = "h11"
+        # Sessions live in process memory, so more than one worker needs
+        # per-user routing in front (see "Scaling Across Cores" in the README)
+        uvicorn.run(
+            "api_server:app",
+            host=DEFAULT_HOST,
+            port=DEFAULT_PORT,
+            workers=int(os.getenv(ENV_WEB_CONCURRENCY, "1")),
+            loop=loop,
+            http=http,
+            limit_concurrency=int(os.getenv(ENV_MAX_CONCURRENCY, str(DEFAULT_MAX_CONCURRENCY))),
+            backlog=SERVER_BACKLOG,
+            timeout_keep_alive=SERVER_KEEP_ALIVE_SECONDS,
+            log_level="info"
+        )
@@ -5,27 +5,32 @@ Integrates database persistence, step-by-step approval, audit logging, and secur
 """
 
 from fastapi import FastAPI, HTTPException, Header, Request, Response, Depends
-from fastapi.encoders import jsonable_encoder
+from fastapi.responses import ORJSONResponse
 from starlette.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, Field
+from sqlalchemy.orm import Session
 import os
 import uuid
-from datetime import datetime, date
-from typing import Dict, Any, Optional, List
-from decimal import Decimal
-from uuid import UUID
-import base64
+from datetime import datetime
+from typing import Dict, Any, Optional, List, Set, Tuple
 import logging
-import traceback
 import asyncio
+import time
+import heapq
+from contextlib import suppress
+import orjson
+from dataclasses import dataclass, field
+from concurrent.futures import ThreadPoolExecutor
+from collections import defaultdict
 
 # Import existing modules
-from agent import Agent
+from agent import Agent, configure_logging
 from ssh_manager import SSHManager
 from command_executor import CommandExecutor
+from command_generator import OPENAI_CALL_BUDGET_SECONDS
 
 # Import new database modules  
-from database import get_db, init_database
+from database import db_session, get_db, init_database
 from database_service import DatabaseService
 from secrets_manager import SecretsManager
 
@@ -33,51 +38,46 @@ from secrets_manager import SecretsManager
 DEFAULT_PORT = 8000
 DEFAULT_HOST = "0.0.0.0"
 DEFAULT_SSH_PORT = 22
+ENV_DEV_MODE = "OTIUM_DEV"  # Set to 1 to run with auto-reload
 
 # Setup logging
 logger = logging.getLogger(__name__)
 
-# Safe serialization helpers
-def _default_encoder(obj):
-    """Custom encoder for non-JSON-serializable objects"""
-    if isinstance(obj, (datetime, date)):
-        return obj.isoformat()
-    if isinstance(obj, Decimal):
-        return float(obj)
-    if isinstance(obj, UUID):
-        return str(obj)
-    if isinstance(obj, (bytes, bytearray)):
-        # Avoid dumping raw bytes into JSON
-        return {"__type__": "bytes", "base64": base64.b64encode(obj).decode("ascii")}
-    if isinstance(obj, set):
-        return list(obj)
-    # Last resort: stringify
-    return str(obj)
+# Placeholder results for commands that have not run yet (shared, treat as read-only)
+EMPTY_EXECUTION_RESULTS = {
+    "success": False,
+    "total_steps": 0,
+    "successful_steps": 0,
+    "failed_steps": 0,
+    "skipped_steps": 0,
+    "total_execution_time": 0.0,
+    "step_results": []
+}
 
+# Safe serialization helpers
 def serialize_command(cmd) -> dict:
-    """Safely serialize a command object to JSON-compatible dict"""
+    """Safely serialize a Command row to a JSON-compatible dict"""
     try:
-        # Build dict with safe field access - let FastAPI handle JSON serialization
-        payload = {
-            "id": str(cmd.id) if cmd.id else None,
-            "connection_id": str(cmd.connection_id) if cmd.connection_id else None,
-            "request": getattr(cmd, "request", None) or "",
-            "priority": getattr(cmd, "priority", None) or "normal",
-            "status": getattr(cmd, "status", None) or "pending",
-            "intent": getattr(cmd, "intent", None) or "Unknown",
-            "action": getattr(cmd, "action", None) or "Unknown",
-            "risk_level": getattr(cmd, "risk_level", None) or "medium",
-            "explanation": getattr(cmd, "explanation", None) or "",
-            "created_at": cmd.created_at.isoformat() if getattr(cmd, "created_at", None) else None,
-            "approved_at": cmd.approved_at.isoformat() if getattr(cmd, "approved_at", None) else None,
-            "executed_at": cmd.executed_at.isoformat() if getattr(cmd, "executed_at", None) else None,
-            "completed_at": cmd.completed_at.isoformat() if getattr(cmd, "completed_at", None) else None,
+        # Plain attribute reads: every field below is a Command column
+        return {
+            "id": str(cmd.id) if cmd.id else "",
+            "connection_id": str(cmd.connection_id) if cmd.connection_id else "",
+            "request": cmd.request or "",
+            "priority": cmd.priority or "normal",
+            "status": cmd.status or "pending",
+            "intent": cmd.intent or "Unknown",
+            "action": cmd.action or "Unknown",
+            "risk_level": cmd.risk_level or "medium",
+            "explanation": "",  # Not stored; frontend expects the field
+            "created_at": cmd.created_at,  # datetimes are encoded by the response class
+            "approved_at": cmd.approved_at,
+            "executed_at": cmd.executed_at,
+            "completed_at": cmd.completed_at,
             "generated_commands": cmd.generated_commands or [],  # JSONB field
-            "execution_results": cmd.execution_results or {}     # JSONB field
+            "execution_results": cmd.execution_results or EMPTY_EXECUTION_RESULTS  # JSONB field
         }
-        return payload  # Return plain dict, FastAPI handles JSON serialization
     except Exception as e:
-        logger.error(f"Failed to serialize command {getattr(cmd, 'id', 'unknown')}: {str(e)}")
+        logger.error("Failed to serialize command %s: %s", getattr(cmd, 'id', 'unknown'), e)
         # Return minimal safe representation
         return {
             "id": str(getattr(cmd, "id", "unknown")),
@@ -97,12 +97,82 @@ init_database()
 app = FastAPI(
     title="Otium AI Agent API - Enhanced Version",
     description="AI-powered system administration with enterprise security and step-by-step approval",
-    version="2.0.0"
+    version="2.0.0",
+    default_response_class=ORJSONResponse  # orjson encodes datetimes and command payloads in C
 )
 
 # SESSION-BASED: Background task for cleaning up inactive users
 background_task_running = False
 
+# Audit logs are queued by request handlers and written in batches by a background flusher
+AUDIT_FLUSH_MAX_ROWS = 1000
+AUDIT_FLUSH_INTERVAL_SECONDS = 0.05
+audit_log_queue: asyncio.Queue = asyncio.Queue()
+audit_flusher_task: Optional[asyncio.Task] = None
+
+def queue_audit_log(user_id: str, action: str, **fields):
+    """Queue an audit log entry (same keywords as DatabaseService.log_action) for the batch writer"""
+    audit_log_queue.put_nowait({"user_id": user_id, "action": action, "timestamp": datetime.utcnow(), **fields})
+
+def write_audit_logs(entries: List[Dict[str, Any]]):
+    """Write a batch of audit log entries on a dedicated session (blocking)"""
+    with db_session() as db:
+        DatabaseService(db).bulk_log_actions(entries)
+
+def drain_audit_log_queue() -> List[Dict[str, Any]]:
+    """Take every audit log entry that is already queued"""
+    entries = []
+    while not audit_log_queue.empty() and len(entries) < AUDIT_FLUSH_MAX_ROWS:
+        entries.append(audit_log_queue.get_nowait())
+    return entries
+
+# Strong references to fire-and-forget writes so they are not collected mid-flight
+background_tasks = set()
+
+def run_in_background(func, *args):
+    """Run a blocking callable in a worker thread without awaiting it"""
+    task = asyncio.create_task(asyncio.to_thread(func, *args))
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    return task
+
+def record_user_login(user_id: str):
+    """Update a user's last login on a dedicated session (blocking)"""
+    try:
+        with db_session() as db:
+            DatabaseService(db).update_user_last_login(user_id)
+    except Exception as e:
+        logger.error("Failed to update last login for %s: %s", user_id, e)
+
+async def audit_log_flusher():
+    """Background task that coalesces queued audit logs into multi-row inserts"""
+    loop = asyncio.get_running_loop()
+    while True:
+        entries = []
+        try:
+            entries.append(await audit_log_queue.get())
+            deadline = loop.time() + AUDIT_FLUSH_INTERVAL_SECONDS
+            while len(entries) < AUDIT_FLUSH_MAX_ROWS:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    entries.append(await asyncio.wait_for(audit_log_queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            batch, entries = entries, []
+            try:
+                await asyncio.to_thread(write_audit_logs, batch)
+            except Exception as e:
+                logger.error("Failed to write %s audit logs: %s", len(batch), e)
+        finally:
+            # Cancelled mid-batch: write what was already taken off the queue
+            if entries:
+                try:
+                    write_audit_logs(entries)
+                except Exception as e:
+                    logger.error("Failed to write %s audit logs: %s", len(entries), e)
+
 async def inactivity_cleanup_task():
     """Background task to clean up inactive users every 5 minutes"""
     global background_task_running
@@ -110,38 +180,59 @@ async def inactivity_cleanup_task():
     
     while background_task_running:
         try:
-            print("[DEBUG] Running inactivity cleanup check...")
-            cleanup_inactive_users()
+            logger.debug("Running inactivity cleanup check...")
+            await cleanup_inactive_users()
             await asyncio.sleep(300)  # 5 minutes
         except Exception as e:
-            print(f"[ERROR] Inactivity cleanup task error: {str(e)}")
+            logger.error("Inactivity cleanup task error: %s", e)
             await asyncio.sleep(60)  # Wait 1 minute before retrying
 
 @app.on_event("startup")
 async def startup_event():
     """Initialize background tasks on startup"""
-    print("[DEBUG] Starting inactivity cleanup background task...")
+    global audit_flusher_task
+    # Runs in the serving process (including the reload child), after uvicorn's log_config
+    configure_logging(os.getenv("LOG_LEVEL", "INFO"))
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=DEFAULT_EXECUTOR_WORKERS, thread_name_prefix="otium-io")
+    )
+    logger.debug("Starting inactivity cleanup background task...")
     asyncio.create_task(inactivity_cleanup_task())
+    audit_flusher_task = asyncio.create_task(audit_log_flusher())
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Clean up on shutdown"""
     global background_task_running
     background_task_running = False
-    print("[DEBUG] Stopped inactivity cleanup background task")
+    logger.debug("Stopped inactivity cleanup background task")
+    
+    ssh_execution_pool.shutdown(wait=False)
+    
+    # Let pending background writes finish
+    if background_tasks:
+        await asyncio.gather(*background_tasks, return_exceptions=True)
+    
+    # Stop the audit flusher (it writes its in-hand batch) before draining what is still queued
+    if audit_flusher_task:
+        audit_flusher_task.cancel()
+        with suppress(asyncio.CancelledError):
+            await audit_flusher_task
+    while not audit_log_queue.empty():
+        try:
+            write_audit_logs(drain_audit_log_queue())
+        except Exception as e:
+            logger.error("Failed to write audit logs on shutdown: %s", e)
+            break
 
 # CORS Configuration - Local development only
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=[
-        "http://localhost:3000",        # Local development
-        "http://127.0.0.1:3000",        # Alternative localhost
-    ],
+    allow_origin_regex=r"^http://(localhost|127\.0\.0\.1):3000$",  # Local development (localhost or 127.0.0.1)
     allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-    expose_headers=["*"],
-    max_age=600,
+    allow_methods=["GET", "POST", "OPTIONS"],
+    allow_headers=["content-type", "user-id", "authorization"],
+    max_age=86400,  # Browsers cache preflights for a day
 )
 
 # Auth helper that skips OPTIONS requests (handled by CORS middleware)
@@ -153,7 +244,13 @@ def require_auth(request: Request = None, user_id: str = Header(None, alias="use
         raise HTTPException(status_code=401, detail="user-id header required")
     return user_id
 
+def get_db_service(db: Session = Depends(get_db)) -> DatabaseService:
+    """Request-scoped database service; FastAPI closes the session when the request ends"""
+    return DatabaseService(db)
+
 # Pydantic models
+# SSHConnectionResponse, TaskResponse and HealthResponse document response shapes for the
+# OpenAPI schema only; those handlers return ORJSONResponse dicts to skip output validation
 class SSHConnectionRequest(BaseModel):
     hostname: str
     username: str
@@ -180,6 +277,7 @@ class CommandStep(BaseModel):
     risk_level: str
     estimated_time: Optional[str] = None
     status: Optional[str] = "pending"
+    parallel_group: Optional[int] = None  # Steps sharing a group may run concurrently
     approved_by: Optional[str] = None
 
 class TaskResponse(BaseModel):
@@ -198,6 +296,10 @@ class StepApprovalRequest(BaseModel):
     approved: bool
     reason: Optional[str] = None
 
+class BulkStepApprovalRequest(BaseModel):
+    step_indices: List[int]
+    reason: Optional[str] = None
+
 class HealthResponse(BaseModel):
     status: str
     timestamp: str
@@ -205,189 +307,265 @@ class HealthResponse(BaseModel):
     database_status: str
     features: List[str]
 
-# User storage for backward compatibility
-user_agents: Dict[str, Dict[str, Agent]] = {}
-user_connections: Dict[str, Dict[str, Any]] = {}
-user_ssh_managers: Dict[str, SSHManager] = {}
+HEALTH_FEATURES = [
+    "Database Persistence",
+    "Encrypted Credentials",
+    "Step-by-Step Approval",
+    "Audit Logging",
+    "Role-Based Security"
+]
+# Constant part of the encoded health body, open for the timestamp and database_status fields
+HEALTH_BODY_PREFIX = orjson.dumps({"status": "healthy", "version": "2.0.0", "features": HEALTH_FEATURES})[:-1] + b',"timestamp":'
+
+@dataclass(slots=True)
+class UserSession:
+    """Everything held in memory for one user"""
+    ssh_manager: Optional[SSHManager] = None  # None until connect, and again after disconnecting everything
+    connections: Dict[str, Dict[str, Any]] = field(default_factory=dict)  # connection_id -> connection_info
+    alive: Set[str] = field(default_factory=set)  # connection_ids whose SSH session is up, kept in step with connect/disconnect
+    agents: Dict[str, Agent] = field(default_factory=dict)  # connection_id -> Agent
+    executors: Dict[str, CommandExecutor] = field(default_factory=dict)  # connection_id -> CommandExecutor
+    last_activity_ns: int = 0  # time.monotonic_ns() of the user's last request
+
+# User-scoped storage, one lookup per request
+user_sessions: Dict[str, UserSession] = {}
+# asyncio.to_thread work (SSH connect/disconnect, encryption, DB writes) runs on the
+# loop's default executor; sized explicitly instead of relying on the CPU-count default
+DEFAULT_EXECUTOR_WORKERS = 32
+
+# Blocking SSH command execution runs on its own pool, sized for the expected
+# number of concurrent SSH sessions, so it never stalls the event loop
+SSH_EXECUTION_WORKERS = 32
+ssh_execution_pool = ThreadPoolExecutor(max_workers=SSH_EXECUTION_WORKERS, thread_name_prefix="ssh-exec")
+
+# Cap on concurrent command submissions; each holds an LLM call and SSH work
+MAX_INFLIGHT_SUBMISSIONS = int(os.getenv("OTIUM_MAX_INFLIGHT_SUBMISSIONS", "128"))
+submission_semaphore = asyncio.Semaphore(MAX_INFLIGHT_SUBMISSIONS)
+
+# Plan generation runs in worker threads; cap concurrent LLM calls and bound how long a request waits.
+# The default wait covers the OpenAI client's own timeout and retries, so it only fires on a stuck call
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", "8"))
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", str(OPENAI_CALL_BUDGET_SECONDS + 5)))
+llm_semaphore = asyncio.Semaphore(LLM_CONCURRENCY)
+
+# Started agents (and their system context) are reused per connection for a short
+# window; the per-connection lock lets concurrent submits share one initialization
+AGENT_REUSE_TTL_SECONDS = 60
+agent_started_at: Dict[Tuple[str, str], float] = {}
+agent_init_locks: Dict[Tuple[str, str], asyncio.Lock] = defaultdict(asyncio.Lock)
 
 # SESSION-BASED: Inactivity tracking
 INACTIVITY_TIMEOUT_MINUTES = 60  # 60 minutes of inactivity before auto-disconnect (was 20)
-user_last_activity: Dict[str, datetime] = {}
+INACTIVITY_TIMEOUT_NS = INACTIVITY_TIMEOUT_MINUTES * 60 * 1_000_000_000
+# Min-heap of (deadline_ns, user_id), one entry per tracked user. Deadlines can be stale
+# (the user was active since); cleanup re-checks and reschedules those instead of scanning
+inactivity_deadlines: List[Tuple[int, str]] = []
+
+# Encoded /api/health body and when it was built (time.monotonic())
+HEALTH_CACHE_TTL_SECONDS = 1.0
+health_cache: Tuple[float, bytes] = (float("-inf"), b"")
 
 # Initialize secrets manager
 secrets_manager = SecretsManager()
 
 # SESSION-BASED: Inactivity management functions
-def update_user_activity(user_id: str):
-    """Update the last activity timestamp for a user"""
-    user_last_activity[user_id] = datetime.now()
-    print(f"[DEBUG] Updated activity for user {user_id}")
+def update_user_activity(user_id: str) -> UserSession:
+    """Update the last activity timestamp for a user and return their session"""
+    now_ns = time.monotonic_ns()
+    session = user_sessions.get(user_id)
+    if session is None:
+        session = user_sessions[user_id] = UserSession()
+        heapq.heappush(inactivity_deadlines, (now_ns + INACTIVITY_TIMEOUT_NS, user_id))
+    session.last_activity_ns = now_ns
+    logger.debug("Updated activity for user %s", user_id)
+    return session
 
 def resolve_active_connection_id(user_id: str, requested_connection_id: str = None) -> str:
     """Resolve the active connection ID for a user - prefer requested if alive, else pick any alive"""
-    mem = user_connections.get(user_id, {})
-    alive = [cid for cid, info in mem.items() if info.get("alive")]
-    
-    if requested_connection_id and requested_connection_id in alive:
-        return requested_connection_id
-    if alive:
-        return alive[0]
+    session = user_sessions.get(user_id)
+    if session is not None and session.alive:
+        if requested_connection_id in session.alive:
+            return requested_connection_id
+        return next(iter(session.alive))
     raise HTTPException(status_code=409, detail="No active SSH connection. Please reconnect and try again.")
 
 def persist_connection_remap(db_service, command_id: str, resolved_conn_id: str, user_id: str):
     """Update command's connection_id if it was remapped to an active connection"""
     # For now, just log - we can implement DB update later if needed
-    print(f"[DEBUG] Connection remapped for command {command_id}: using {resolved_conn_id}")
+    logger.debug("Connection remapped for command %s: using %s", command_id, resolved_conn_id)
+
+async def disconnect_connections(ssh_manager: SSHManager, connection_ids: List[str]):
+    """Close SSH connections on worker threads (paramiko teardown blocks), logging failures"""
+    results = await asyncio.gather(
+        *(asyncio.to_thread(ssh_manager.disconnect, connection_id) for connection_id in connection_ids),
+        return_exceptions=True
+    )
+    for connection_id, result in zip(connection_ids, results):
+        if isinstance(result, Exception):
+            logger.error("Failed to disconnect %s: %s", connection_id, result)
+        else:
+            logger.debug("Disconnected connection %s", connection_id)
 
-def cleanup_inactive_users():
+def forget_agent(user_id: str, session: UserSession, connection_id: str):
+    """Drop a connection's cached agent along with its start time and init lock"""
+    session.agents.pop(connection_id, None)
+    agent_started_at.pop((user_id, connection_id), None)
+    agent_init_locks.pop((user_id, connection_id), None)
+
+async def cleanup_inactive_users():
     """Disconnect users who have been inactive for too long"""
-    if not user_last_activity:
-        return
-        
-    current_time = datetime.now()
+    now_ns = time.monotonic_ns()
     inactive_users = []
     
-    for user_id, last_activity in user_last_activity.items():
-        time_since_activity = current_time - last_activity
-        if time_since_activity.total_seconds() > (INACTIVITY_TIMEOUT_MINUTES * 60):
+    # Only users whose deadline has passed are looked at
+    while inactivity_deadlines and inactivity_deadlines[0][0] <= now_ns:
+        _, user_id = heapq.heappop(inactivity_deadlines)
+        session = user_sessions.get(user_id)
+        if session is None:
+            continue
+        deadline = session.last_activity_ns + INACTIVITY_TIMEOUT_NS
+        if deadline <= now_ns:
             inactive_users.append(user_id)
+        else:
+            heapq.heappush(inactivity_deadlines, (deadline, user_id))
     
     for user_id in inactive_users:
-        print(f"[DEBUG] Disconnecting inactive user {user_id} (inactive for {INACTIVITY_TIMEOUT_MINUTES} minutes)")
-        
-        # Disconnect all SSH connections for this user
-        if user_id in user_ssh_managers:
-            ssh_manager = user_ssh_managers[user_id]
-            if user_id in user_connections:
-                for connection_id in list(user_connections[user_id].keys()):
-                    try:
-                        ssh_manager.disconnect(connection_id)
-                        print(f"[DEBUG] Disconnected connection {connection_id} for inactive user {user_id}")
-                    except Exception as e:
-                        print(f"[ERROR] Failed to disconnect {connection_id}: {str(e)}")
-                
-                # Clear user's connections
-                user_connections[user_id].clear()
-            
-            # Remove SSH manager
-            del user_ssh_managers[user_id]
-        
-        # Remove user from tracking
-        del user_last_activity[user_id]
-        if user_id in user_agents:
-            del user_agents[user_id]
-        if user_id in user_connections:
-            del user_connections[user_id]
+        logger.debug("Disconnecting inactive user %s (inactive for %s minutes)", user_id, INACTIVITY_TIMEOUT_MINUTES)
+        
+        # Remove user from tracking, then disconnect all SSH connections for this user
+        session = user_sessions.pop(user_id)
+        for key in [key for key in agent_started_at if key[0] == user_id]:
+            del agent_started_at[key]
+            agent_init_locks.pop(key, None)
+        if session.ssh_manager is not None:
+            await disconnect_connections(session.ssh_manager, list(session.connections))
 
-@app.get("/api/health", response_model=HealthResponse)
-async def health_check():
-    """Enhanced health check with database status"""
+def build_health_body(db_service: DatabaseService) -> bytes:
+    """Probe the database and encode the health payload (HealthResponse shape)"""
     try:
-        db = next(get_db())
-        db.close()
+        db_service.db.connection()  # Check out a pooled connection
         db_status = "connected"
     except Exception as e:
         db_status = f"error: {str(e)}"
     
-    return HealthResponse(
-        status="healthy",
-        timestamp=datetime.now().isoformat(),
-        version="2.0.0",
-        database_status=db_status,
-        features=[
-            "Database Persistence",
-            "Encrypted Credentials",
-            "Step-by-Step Approval",
-            "Audit Logging",
-            "Role-Based Security"
-        ]
-    )
+    # Only the two varying fields are encoded per call
+    return b"".join((
+        HEALTH_BODY_PREFIX,
+        orjson.dumps(datetime.now().isoformat()),
+        b',"database_status":',
+        orjson.dumps(db_status),
+        b"}"
+    ))
+
+def probe_health() -> bytes:
+    """Build the encoded health payload on a session of its own"""
+    with db_session() as db:
+        return build_health_body(DatabaseService(db))
 
-@app.post("/api/connect", response_model=SSHConnectionResponse)
+@app.get("/api/health", response_model=None, responses={200: {"model": HealthResponse}})
+async def health_check():
+    """Enhanced health check with database status, cached briefly so probe floods cost one DB round-trip"""
+    global health_cache
+    now = time.monotonic()
+    cached_at, body = health_cache
+    if now - cached_at >= HEALTH_CACHE_TTL_SECONDS:
+        body = await asyncio.to_thread(probe_health)
+        health_cache = (now, body)
+    return Response(content=body, media_type="application/json")
+
+@app.get("/api/health/deep", response_model=None, responses={200: {"model": HealthResponse}})
+async def deep_health_check(db_service: DatabaseService = Depends(get_db_service)):
+    """Uncached health check that always probes the database"""
+    return Response(content=build_health_body(db_service), media_type="application/json")
+
+@app.post("/api/connect", response_model=None, responses={200: {"model": SSHConnectionResponse}})
 async def connect_to_server(
     request: Request,
     ssh_request: SSHConnectionRequest, 
-    user_id: str = Depends(require_auth)
+    user_id: str = Depends(require_auth),
+    db_service: DatabaseService = Depends(get_db_service)
 ):
     """Connect to server with encrypted credential storage"""
     # SESSION-BASED: Update user activity
-    update_user_activity(user_id)
+    session = update_user_activity(user_id)
     
-    print(f"[DEBUG] Connect request from user {user_id} to {ssh_request.hostname}:{ssh_request.port}")
-    print(f"[DEBUG] SSH Request details: hostname={ssh_request.hostname}, username={ssh_request.username}, port={ssh_request.port}")
+    logger.debug("Connect request from user %s to %s:%s", user_id, ssh_request.hostname, ssh_request.port)
+    logger.debug("SSH Request details: hostname=%s, username=%s, port=%s", ssh_request.hostname, ssh_request.username, ssh_request.port)
     try:
-        # Get database service
-        print(f"[DEBUG] Getting database connection...")
-        db = next(get_db())
-        print(f"[DEBUG] Creating database service...")
-        db_service = DatabaseService(db)
-        print(f"[DEBUG] Database service created successfully")
-        
-        # Create or get WorkOS user (not tied to server credentials)
-        print(f"[DEBUG] Creating/getting WorkOS user {user_id}...")
-        user = db_service.create_or_get_user(user_id, f"{user_id}@otium.app")  # Use WorkOS ID for email
-        print(f"[DEBUG] WorkOS user created/retrieved: {user}")
-        
         # Initialize user storage
-        print(f"[DEBUG] Initializing user storage...")
-        if user_id not in user_ssh_managers:
-            print(f"[DEBUG] Creating new SSHManager for user {user_id}")
-            user_ssh_managers[user_id] = SSHManager()
-        if user_id not in user_connections:
-            user_connections[user_id] = {}
-        if user_id not in user_agents:
-            user_agents[user_id] = {}
-        print(f"[DEBUG] User storage initialized successfully")
-        
-        # Check if user already has an active connection
-        if user_id in user_connections and user_connections[user_id]:
-            # User already has a connection - disconnect old one first
-            for conn_id, conn_info in list(user_connections[user_id].items()):
-                if conn_info.get('status') == STATUS_CONNECTED:
-                    print(f"[DEBUG] User {user_id} already has active connection {conn_id}, disconnecting first")
-                    ssh_manager = user_ssh_managers[user_id]
-                    ssh_manager.disconnect(conn_id)
-                    del user_connections[user_id][conn_id]
-        
-        # Connect via SSH
-        ssh_manager = user_ssh_managers[user_id]
-        connection_result = ssh_manager.connect_and_store(
-            hostname=ssh_request.hostname,
-            username=ssh_request.username,
-            password=ssh_request.password,
-            port=ssh_request.port
+        logger.debug("Initializing user storage...")
+        if session.ssh_manager is None:
+            logger.debug("Creating new SSHManager for user %s", user_id)
+            session.ssh_manager = SSHManager()
+        ssh_manager = session.ssh_manager
+        logger.debug("User storage initialized successfully")
+        
+        # Check if user already has an active connection - disconnect old one first
+        for conn_id, conn_info in list(session.connections.items()):
+            if conn_info.get('status') == STATUS_CONNECTED:
+                logger.debug("User %s already has active connection %s, disconnecting first", user_id, conn_id)
+                session.connections.pop(conn_id, None)
+                session.alive.discard(conn_id)
+                session.executors.pop(conn_id, None)
+                forget_agent(user_id, session, conn_id)
+                await asyncio.to_thread(ssh_manager.disconnect, conn_id)
+        
+        # Connect via SSH while the WorkOS user record (not tied to server credentials)
+        # and the credential encryption proceed alongside it
+        credentials = {
+            "hostname": ssh_request.hostname,
+            "username": ssh_request.username,
+            "password": ssh_request.password,
+            "port": ssh_request.port
+        }
+        user, connection_result, encrypted_credentials = await asyncio.gather(
+            asyncio.to_thread(db_service.create_or_get_user, user_id, f"{user_id}@otium.app"),  # Use WorkOS ID for email
+            asyncio.to_thread(
+                ssh_manager.connect_and_store,
+                hostname=ssh_request.hostname,
+                username=ssh_request.username,
+                password=ssh_request.password,
+                port=ssh_request.port
+            ),
+            asyncio.to_thread(secrets_manager.encrypt_credentials, credentials),
+            return_exceptions=True
         )
+        if isinstance(connection_result, BaseException):
+            raise connection_result
+        # An SSH session opened alongside a failed upsert/encryption is not tracked anywhere yet; close it
+        failure = next((r for r in (user, encrypted_credentials) if isinstance(r, BaseException)), None)
+        if failure is not None:
+            if connection_result['success']:
+                await asyncio.to_thread(ssh_manager.disconnect, connection_result['connection_id'])
+            raise failure
+        logger.debug("WorkOS user created/retrieved: %s", user)
         
         if not connection_result['success']:
-            db_service.log_action(
+            queue_audit_log(
                 user_id=user_id,
                 action="connect_failed",
                 details={"hostname": ssh_request.hostname, "error": connection_result['error']},
                 success=False
             )
-            db.close()
             raise HTTPException(status_code=400, detail=connection_result['error'])
         
-        # Encrypt and store credentials
+        # Store encrypted credentials
         connection_id = connection_result['connection_id']
-        credentials = {
-            "hostname": ssh_request.hostname,
-            "username": ssh_request.username,
-            "password": ssh_request.password,
-            "port": ssh_request.port
-        }
-        encrypted_credentials = secrets_manager.encrypt_credentials(credentials)
         
         # Store connection in database (any user can connect to any server)
-        print(f"[DEBUG] Creating connection record for user {user_id} to {ssh_request.hostname}...")
-        db_service.create_connection(
-            user_id=user_id,  # Use actual WorkOS user ID
-            hostname=ssh_request.hostname,
-            username=ssh_request.username,
-            encrypted_credentials=encrypted_credentials,
-            port=ssh_request.port
-        )
-        print(f"[DEBUG] Connection record created successfully")
+        logger.debug("Creating connection record for user %s to %s...", user_id, ssh_request.hostname)
+        try:
+            db_service.create_connection(
+                user_id=user_id,  # Use actual WorkOS user ID
+                hostname=ssh_request.hostname,
+                username=ssh_request.username,
+                encrypted_credentials=encrypted_credentials,
+                port=ssh_request.port
+            )
+        except Exception:
+            await asyncio.to_thread(ssh_manager.disconnect, connection_id)
+            raise
+        logger.debug("Connection record created successfully")
         
         # Store in memory for active use
         connection_info = {
@@ -399,16 +577,17 @@ async def connect_to_server(
             "status": STATUS_CONNECTED,
             "alive": True  # Add alive flag for frontend compatibility
         }
-        user_connections[user_id][connection_id] = connection_info
+        session.connections[connection_id] = connection_info
+        session.alive.add(connection_id)
         
-        print(f"[DEBUG] Stored connection {connection_id} for user {user_id}: {connection_info}")
-        print(f"[DEBUG] Total connections for user: {len(user_connections[user_id])}")
+        logger.debug("Stored connection %s for user %s: %s", connection_id, user_id, connection_info)
+        logger.debug("Total connections for user: %s", len(session.connections))
         
         # Initialize agent
         agent = await initialize_agent(user_id, connection_id)
         
         # Log successful connection
-        db_service.log_action(
+        queue_audit_log(
             user_id=user_id,
             action="connect",
             details={
@@ -419,167 +598,168 @@ async def connect_to_server(
             success=True
         )
         
-        db_service.update_user_last_login(user_id)
-        db.close()
+        # Last login is bookkeeping only; keep it off the response path
+        run_in_background(record_user_login, user_id)
         
-        return SSHConnectionResponse(
-            success=True,
-            connection_id=connection_id,
-            message="SSH connection established successfully",
-            hostname=ssh_request.hostname,
-            username=ssh_request.username,
-            port=ssh_request.port
-        )
+        return ORJSONResponse({
+            "success": True,
+            "connection_id": connection_id,
+            "message": "SSH connection established successfully",
+            "hostname": ssh_request.hostname,
+            "username": ssh_request.username,
+            "port": ssh_request.port
+        })
         
     except HTTPException as he:
-        print(f"[DEBUG] HTTPException in connect: {he.detail}")
+        logger.debug("HTTPException in connect: %s", he.detail)
         raise
     except Exception as e:
-        print(f"[ERROR] Unexpected error in connect: {str(e)}")
-        import traceback
-        print(f"[ERROR] Full traceback: {traceback.format_exc()}")
+        logger.exception("Unexpected error in connect: %s", e)
         raise HTTPException(status_code=500, detail=f"Connection failed: {str(e)}")
 
-@app.post("/api/commands", response_model=TaskResponse)
+@app.post("/api/commands", response_model=None, responses={200: {"model": TaskResponse}})
 async def submit_task(
     request: Request,
     task_request: TaskRequest,
-    user_id: str = Depends(require_auth)
+    user_id: str = Depends(require_auth),
+    db_service: DatabaseService = Depends(get_db_service)
 ):
     """Submit task with database persistence and step-by-step approval"""
+    # Shed load instead of queueing without bound when every slot is taken
+    if submission_semaphore.locked():
+        raise HTTPException(status_code=503, detail="Server busy, please retry", headers={"Retry-After": "1"})
+    async with submission_semaphore:
+        return await _submit_task(task_request, user_id, db_service)
+
+async def _submit_task(task_request: TaskRequest, user_id: str, db_service: DatabaseService):
+    """Plan, persist and log a submitted task (runs inside the submission limit)"""
     # SESSION-BASED: Update user activity
-    update_user_activity(user_id)
+    session = update_user_activity(user_id)
     
-    print(f"[DEBUG] Task submission from user {user_id}")
-    print(f"[DEBUG] Task request: connection_id={task_request.connection_id}, request='{task_request.request}'")
+    # Hoisted once; these are read repeatedly below
+    requested_connection_id = task_request.connection_id
+    request_text = task_request.request
+    
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Task submission from user %s", user_id)
+        logger.debug("Task request: connection_id=%s, request=%r", requested_connection_id, request_text)
     try:
-        # Get database service
-        db = next(get_db())
-        db_service = DatabaseService(db)
-        
         # Smart connection selection - prefer active memory connections over database ones
-        print(f"[DEBUG] Validating connection {task_request.connection_id} for user {user_id}")
+        logger.debug("Validating connection %s for user %s", requested_connection_id, user_id)
         
         # Get memory connections (active SSH sessions)
-        memory_connection_ids = set()
-        if user_id in user_connections:
-            memory_connection_ids = set(user_connections[user_id].keys())
-        print(f"[DEBUG] Memory/Active connection IDs: {list(memory_connection_ids)}")
+        memory_connection_ids = session.alive
+        logger.debug("Memory/Active connection IDs: %s", memory_connection_ids)
         
         # Get database connections
-        db_connections = db_service.get_user_active_connections(user_id)
-        db_connection_ids = {conn.id for conn in db_connections}
-        print(f"[DEBUG] Database connection IDs: {list(db_connection_ids)}")
+        db_connection_ids = db_service.get_user_active_connection_ids(user_id)
+        logger.debug("Database connection IDs: %s", db_connection_ids)
+        
+        # Return the pooled DB connection while the agent and LLM work runs (seconds);
+        # the session checks out a fresh one when the command is persisted
+        db_service.db.close()
         
         # Smart connection selection logic - PREFER active memory connections
-        actual_connection_id = task_request.connection_id
+        actual_connection_id = requested_connection_id
         
         # If requested connection exists in memory (active), use it as-is
-        if task_request.connection_id in memory_connection_ids:
-            print(f"[DEBUG] Using requested connection {task_request.connection_id} (found in active memory)")
+        if requested_connection_id in memory_connection_ids:
+            logger.debug("Using requested connection %s (found in active memory)", requested_connection_id)
         # If we have active memory connections but requested connection is stale (database-only), switch to active
-        elif memory_connection_ids and task_request.connection_id in db_connection_ids:
-            actual_connection_id = list(memory_connection_ids)[0]  # Use first active connection
-            print(f"[DEBUG] Requested connection {task_request.connection_id} is stale (database only)")
-            print(f"[DEBUG] Switching to active memory connection: {actual_connection_id}")
+        elif memory_connection_ids and requested_connection_id in db_connection_ids:
+            actual_connection_id = next(iter(memory_connection_ids))  # Use first active connection
+            logger.debug("Requested connection %s is stale (database only)", requested_connection_id)
+            logger.debug("Switching to active memory connection: %s", actual_connection_id)
         # If requested connection exists in database and no memory connections, try to use it
-        elif task_request.connection_id in db_connection_ids:
-            print(f"[DEBUG] Using requested connection {task_request.connection_id} (found in database, no memory connections)")
+        elif requested_connection_id in db_connection_ids:
+            logger.debug("Using requested connection %s (found in database, no memory connections)", requested_connection_id)
         # If connection doesn't exist anywhere, fail
         else:
-            all_connection_ids = db_connection_ids.union(memory_connection_ids)
-            print(f"[DEBUG] Connection {task_request.connection_id} not found for user {user_id}")
-            print(f"[DEBUG] Available connections: {list(all_connection_ids)}")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Connection %s not found for user %s", requested_connection_id, user_id)
+                logger.debug("Available connections: %s", db_connection_ids | memory_connection_ids)
             raise HTTPException(status_code=404, detail="Connection not found")
         
-        print(f"[DEBUG] Connection validation passed, using connection: {actual_connection_id}")
+        logger.debug("Connection validation passed, using connection: %s", actual_connection_id)
         
         # Update the connection_id to use the active one
         task_request.connection_id = actual_connection_id
         
         # Generate command plan
-        print(f"[DEBUG] Initializing agent for user {user_id}, connection {task_request.connection_id}")
-        agent = await initialize_agent(user_id, task_request.connection_id)
+        logger.debug("Initializing agent for user %s, connection %s", user_id, actual_connection_id)
+        agent = await get_or_initialize_agent(user_id, actual_connection_id)
         if not agent:
-            print(f"[DEBUG] Failed to initialize AI agent")
+            logger.debug("Failed to initialize AI agent")
             raise HTTPException(status_code=500, detail="Failed to initialize AI agent")
-        print(f"[DEBUG] Agent initialized successfully")
+        logger.debug("Agent initialized successfully")
         
-        print(f"[DEBUG] Generating command plan...")
-        command_plan = await generate_command_plan(user_id, task_request.connection_id, task_request.request)
-        print(f"[DEBUG] Command plan generated successfully: {len(command_plan.get('steps', []))} steps")
+        logger.debug("Generating command plan...")
+        command_plan = await generate_command_plan(user_id, actual_connection_id, request_text)
+        plan_steps = command_plan.get('steps', [])
+        logger.debug("Command plan generated successfully: %s steps", len(plan_steps))
         
         # Ensure we use a connection_id that exists in database for foreign key constraint
         database_connection_id = None
         if db_connection_ids:
             # Use the first database connection ID to satisfy foreign key constraint
-            database_connection_id = list(db_connection_ids)[0]
-            print(f"[DEBUG] Using database connection ID for command: {database_connection_id}")
+            database_connection_id = next(iter(db_connection_ids))
+            logger.debug("Using database connection ID for command: %s", database_connection_id)
         else:
             # If no database connection, we need to create one for the active connection
-            print(f"[DEBUG] No database connection found, creating record for active connection: {actual_connection_id}")
+            logger.debug("No database connection found, creating record for active connection: %s", actual_connection_id)
             # This should rarely happen if connection persistence is working correctly
             database_connection_id = actual_connection_id
         
-        # Create command in database
-        command = db_service.create_command(
-            user_id=user_id,
-            connection_id=database_connection_id,  # Use database connection ID for foreign key
-            request=task_request.request,
-            intent=command_plan.get('intent', 'Unknown'),
-            action=command_plan.get('action', 'Unknown'),
-            risk_level=command_plan.get('risk_level', 'medium'),
-            priority=task_request.priority,
-            generated_commands=command_plan['steps']
+        # Create the command in database without blocking the event loop
+        command = await asyncio.to_thread(
+            _persist_command, db_service, user_id, database_connection_id, task_request, command_plan
         )
         
         # Log the action
-        db_service.log_action(
+        queue_audit_log(
             user_id=user_id,
             action="submit_command",
             details={
                 "command_id": command.id,
-                "request": task_request.request,
-                "total_steps": len(command_plan['steps'])
+                "request": request_text,
+                "total_steps": len(plan_steps)
             },
             command_id=command.id,
-            connection_id=task_request.connection_id,
+            connection_id=actual_connection_id,
             success=True
         )
         
-        db.close()
-        
         # Convert to response format
-        command_steps = []
-        for i, step in enumerate(command_plan['steps']):
-            command_steps.append(CommandStep(
-                step=i + 1,
-                command=step.get('command', ''),
-                explanation=step.get('explanation', ''),
-                risk_level=step.get('risk_level', 'medium'),
-                estimated_time=step.get('estimated_time', 'Unknown'),
-                status="pending"
-            ))
+        command_steps = [
+            {
+                "step": i,
+                "command": step.get('command', ''),
+                "explanation": step.get('explanation', ''),
+                "risk_level": step.get('risk_level', 'medium'),
+                "estimated_time": step.get('estimated_time', 'Unknown'),
+                "status": "pending",
+                "parallel_group": step.get('parallel_group')
+            }
+            for i, step in enumerate(plan_steps, 1)
+        ]
         
-        return TaskResponse(
-            command_id=command.id,
-            status=STATUS_PENDING_APPROVAL,
-            generated_commands=command_steps,
-            intent=command.intent,
-            action=command.action,
-            risk_level=command.risk_level,
-            explanation=command_plan.get('explanation', 'No explanation'),
-            created_at=command.created_at.isoformat(),
-            approval_required=True
-        )
+        return ORJSONResponse({
+            "command_id": command.id,
+            "status": STATUS_PENDING_APPROVAL,
+            "generated_commands": command_steps,
+            "intent": command.intent,
+            "action": command.action,
+            "risk_level": command.risk_level,
+            "explanation": command_plan.get('explanation', 'No explanation'),
+            "created_at": command.created_at.isoformat(),
+            "approval_required": True
+        })
         
     except HTTPException as he:
-        print(f"[DEBUG] HTTPException in submit_task: {he.detail}")
+        logger.debug("HTTPException in submit_task: %s", he.detail)
         raise
     except Exception as e:
-        print(f"[ERROR] Unexpected error in submit_task: {str(e)}")
-        import traceback
-        print(f"[ERROR] Full traceback: {traceback.format_exc()}")
+        logger.exception("Unexpected error in submit_task: %s", e)
         raise HTTPException(status_code=500, detail=f"Command submission failed: {str(e)}")
 
 @app.post("/api/commands/{command_id}/approve-step")
@@ -587,22 +767,19 @@ async def approve_command_step(
     command_id: str,
     request: Request,
     approval_request: StepApprovalRequest,
-    user_id: str = Depends(require_auth)
+    user_id: str = Depends(require_auth),
+    db_service: DatabaseService = Depends(get_db_service)
 ):
     """Approve or reject a specific command step - APPROVE = EXECUTE IMMEDIATELY"""
-    print(f"[DEBUG] ===== APPROVE COMMAND STEP CALLED =====")
-    print(f"[DEBUG] Command ID: {command_id}")
-    print(f"[DEBUG] User ID: {user_id}")
-    print(f"[DEBUG] Approval Request: {approval_request}")
+    logger.debug("===== APPROVE COMMAND STEP CALLED =====")
+    logger.debug("Command ID: %s", command_id)
+    logger.debug("User ID: %s", user_id)
+    logger.debug("Approval Request: %s", approval_request)
     
     # SESSION-BASED: Update user activity
     update_user_activity(user_id)
     
     try:
-        # Get database service
-        db = next(get_db())
-        db_service = DatabaseService(db)
-        
         # Create step approval
         approval = db_service.create_step_approval(
             command_id=command_id,
@@ -613,7 +790,7 @@ async def approve_command_step(
         )
         
         # Log the approval
-        db_service.log_action(
+        queue_audit_log(
             user_id=user_id,
             action="step_approval",
             details={
@@ -635,86 +812,44 @@ async def approve_command_step(
         # If APPROVED, execute the step immediately
         if approval_request.approved:
             try:
-                print(f"[DEBUG] Executing approved step {approval_request.step_index} immediately")
+                logger.debug("Executing approved step %s immediately", approval_request.step_index)
                 
                 # Resolve active connection
                 resolved_conn_id = resolve_active_connection_id(user_id, command.connection_id)
-                print(f"[DEBUG] Resolved connection ID: {resolved_conn_id}")
+                logger.debug("Resolved connection ID: %s", resolved_conn_id)
                 
                 # Get SSH manager
-                ssh_manager = user_ssh_managers.get(user_id)
+                ssh_manager = get_user_ssh_manager(user_id)
                 if not ssh_manager:
-                    print(f"[ERROR] SSH manager not found for user {user_id}")
+                    logger.error("SSH manager not found for user %s", user_id)
                     raise Exception("SSH session expired. Please reconnect.")
                 
-                # Create CommandExecutor
-                from command_executor import CommandExecutor
-                executor = CommandExecutor(ssh_manager, resolved_conn_id)
+                # Reuse the connection's CommandExecutor
+                executor = get_command_executor(user_id, ssh_manager, resolved_conn_id)
                 
                 # Execute only this specific step
                 step_command = command.generated_commands[approval_request.step_index]
-                print(f"[DEBUG] Executing command: {step_command.get('command')}")
+                logger.debug("Executing command: %s", step_command.get('command'))
                 
                 # Execute single step
-                result = executor.execute_single_step(step_command, approval_request.step_index)
+                result = await asyncio.get_running_loop().run_in_executor(
+                    ssh_execution_pool, executor.execute_single_step, step_command, approval_request.step_index
+                )
                 execution_result = result
                 
-                print(f"[DEBUG] Step execution result: {result}")
-                
-                # Save execution result to database
-                # CRITICAL: Refresh command from database to get latest execution_results
-                # (another step might have saved results while we were executing)
-                db_service.db.refresh(command)
-                
-                # Get existing execution_results or create new structure
-                existing_results = command.execution_results or {
-                    "success": None,
-                    "total_steps": len(command.generated_commands) if command.generated_commands else 0,
-                    "successful_steps": 0,
-                    "failed_steps": 0,
-                    "skipped_steps": 0,
-                    "total_execution_time": 0,
-                    "step_results": []
-                }
-                
-                # Initialize step_results if it doesn't exist
-                if "step_results" not in existing_results:
-                    existing_results["step_results"] = []
-                
-                # Add this step's result
-                step_result = {
-                    "step_index": approval_request.step_index,
-                    "command": step_command.get('command', ''),
-                    "success": result.get('success', False),
-                    "status": result.get('status', 'unknown'),
-                    "output": result.get('output', ''),
-                    "stderr": result.get('stderr', ''),
-                    "error": result.get('error', ''),
-                    "exit_code": result.get('exit_code', -1),
-                    "execution_time": result.get('execution_time', 0)
-                }
-                existing_results["step_results"].append(step_result)
-                
-                # Update counters
-                if result.get('success', False):
-                    existing_results["successful_steps"] = existing_results.get("successful_steps", 0) + 1
-                else:
-                    existing_results["failed_steps"] = existing_results.get("failed_steps", 0) + 1
+                logger.debug("Step execution result: %s", result)
                 
-                existing_results["total_execution_time"] = existing_results.get("total_execution_time", 0) + result.get('execution_time', 0)
-                
-                # Update overall success status
-                total_executed = existing_results.get("successful_steps", 0) + existing_results.get("failed_steps", 0)
-                if total_executed == existing_results.get("total_steps", 0):
-                    # All steps executed - determine overall success
-                    existing_results["success"] = existing_results.get("failed_steps", 0) == 0
-                
-                # Save to database
-                db_service.update_command_execution_results(command_id, existing_results)
-                print(f"[DEBUG] Saved execution result to database for step {approval_request.step_index}")
+                # Append to the stored execution_results in place; other steps may be
+                # saving their results concurrently
+                db_service.append_step_result_atomic(
+                    command_id,
+                    build_step_result(approval_request.step_index, step_command, result),
+                    len(command.generated_commands or [])
+                )
+                logger.debug("Saved execution result to database for step %s", approval_request.step_index)
                 
                 # Log the execution
-                db_service.log_action(
+                queue_audit_log(
                     user_id=user_id,
                     action="step_execution",
                     details={
@@ -729,9 +864,7 @@ async def approve_command_step(
                 )
                 
             except Exception as exec_error:
-                print(f"[ERROR] Step execution failed: {str(exec_error)}")
-                import traceback
-                print(f"[ERROR] Execution traceback: {traceback.format_exc()}")
+                logger.exception("Step execution failed: %s", exec_error)
                 execution_result = {
                     "success": False,
                     "error": str(exec_error),
@@ -739,9 +872,9 @@ async def approve_command_step(
                 }
         else:
             # If REJECTED, just log it (no execution)
-            print(f"[DEBUG] Step {approval_request.step_index} rejected - skipping execution")
-            print(f"[DEBUG] Rejection reason: {approval_request.reason or 'No reason provided'}")
-            db_service.log_action(
+            logger.debug("Step %s rejected - skipping execution", approval_request.step_index)
+            logger.debug("Rejection reason: %s", approval_request.reason or 'No reason provided')
+            queue_audit_log(
                 user_id=user_id,
                 action="step_rejected",
                 details={
@@ -758,65 +891,16 @@ async def approve_command_step(
         total_steps = len(command.generated_commands) if command.generated_commands else 0
         all_responded = len(step_approvals) == total_steps
         
-        print(f"[DEBUG] Step approval check: {len(step_approvals)}/{total_steps} steps have responses")
-        print(f"[DEBUG] All responded: {all_responded}")
+        logger.debug("Step approval check: %s/%s steps have responses", len(step_approvals), total_steps)
+        logger.debug("All responded: %s", all_responded)
         
         if all_responded:
-            print(f"[DEBUG] All steps have responses - marking command as completed")
+            logger.debug("All steps have responses - marking command as completed")
             db_service.update_command_status(command_id, "completed", user_id)
-            print(f"[DEBUG] Command {command_id} status updated to 'completed'")
-        
-        # Get updated approval status for frontend
-        step_approvals = db_service.get_command_approvals(command_id)
-        command = db_service.get_command(command_id, user_id)
+            logger.debug("Command %s status updated to 'completed'", command_id)
         
         # Build approval status response (same format as approval-status endpoint)
-        total_steps = len(command.generated_commands) if command.generated_commands else 0
-        approved_steps = 0
-        rejected_steps = 0
-        pending_steps = 0
-        
-        steps = []
-        for i in range(total_steps):
-            step_approval = next((approval for approval in step_approvals if approval.step_index == i), None)
-            
-            if step_approval:
-                status = "approved" if step_approval.approved else "rejected"
-                if step_approval.approved:
-                    approved_steps += 1
-                else:
-                    rejected_steps += 1
-            else:
-                status = "pending"
-                pending_steps += 1
-            
-            step_data = {
-                "step_index": i,
-                "command": command.generated_commands[i].get('command', '') if command.generated_commands else '',
-                "explanation": command.generated_commands[i].get('explanation', '') if command.generated_commands else '',
-                "risk_level": command.generated_commands[i].get('risk_level', 'medium') if command.generated_commands else 'medium',
-                "estimated_time": command.generated_commands[i].get('estimated_time', 'Unknown') if command.generated_commands else 'Unknown',
-                "status": status,
-                "approved": step_approval.approved if step_approval else None,
-                "approved_by": step_approval.user_id if step_approval else None,
-                "reason": step_approval.approval_reason if step_approval else None,
-                "approved_at": step_approval.approved_at.isoformat() if step_approval and step_approval.approved_at else None
-            }
-            steps.append(step_data)
-        
-        can_execute = (rejected_steps == 0 and pending_steps == 0 and approved_steps == total_steps)
-        
-        approval_status = {
-            "command_id": command_id,
-            "total_steps": total_steps,
-            "approved_steps": approved_steps,
-            "rejected_steps": rejected_steps,
-            "pending_steps": pending_steps,
-            "can_execute": can_execute,
-            "steps": steps
-        }
-        
-        db.close()
+        approval_status = build_approval_status(command_id, command.generated_commands, step_approvals)
         
         return {
             "command_id": command_id,
@@ -833,17 +917,111 @@ async def approve_command_step(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Step approval failed: {str(e)}")
 
+@app.post("/api/commands/{command_id}/approve-steps")
+async def approve_command_steps(
+    command_id: str,
+    bulk_request: BulkStepApprovalRequest,
+    request: Request,
+    user_id: str = Depends(require_auth),
+    db_service: DatabaseService = Depends(get_db_service)
+):
+    """Approve and execute several steps at once; steps sharing a parallel_group run concurrently"""
+    # SESSION-BASED: Update user activity
+    update_user_activity(user_id)
+    
+    command = db_service.get_command(command_id, user_id)
+    if not command:
+        raise HTTPException(status_code=404, detail="Command not found")
+    
+    steps = command.generated_commands or []
+    step_indices = sorted(set(bulk_request.step_indices))
+    if not step_indices or step_indices[0] < 0 or step_indices[-1] >= len(steps):
+        raise HTTPException(status_code=400, detail="Invalid step indices")
+    
+    resolved_conn_id = resolve_active_connection_id(user_id, command.connection_id)
+    ssh_manager = get_user_ssh_manager(user_id)
+    if not ssh_manager:
+        raise HTTPException(status_code=440, detail="SSH session expired. Please reconnect.")
+    executor = get_command_executor(user_id, ssh_manager, resolved_conn_id)
+    
+    try:
+        for step_index in step_indices:
+            db_service.create_step_approval(
+                command_id=command_id,
+                user_id=user_id,
+                step_index=step_index,
+                approved=True,
+                reason=bulk_request.reason
+            )
+            queue_audit_log(
+                user_id=user_id,
+                action="step_approval",
+                details={"command_id": command_id, "step_index": step_index, "approved": True},
+                command_id=command_id,
+                success=True
+            )
+        
+        # Batches run in step order; each batch's steps use their own SSH channels concurrently
+        loop = asyncio.get_running_loop()
+        results: Dict[int, Dict[str, Any]] = {}
+        for batch in group_parallel_steps(step_indices, steps):
+            batch_results = await asyncio.gather(*(
+                loop.run_in_executor(ssh_execution_pool, executor.execute_single_step, steps[step_index], step_index)
+                for step_index in batch
+            ))
+            results.update(zip(batch, batch_results))
+        
+        db_service.append_step_results_atomic(
+            command_id,
+            [build_step_result(step_index, steps[step_index], results[step_index]) for step_index in step_indices],
+            len(steps)
+        )
+        for step_index in step_indices:
+            result = results[step_index]
+            queue_audit_log(
+                user_id=user_id,
+                action="step_execution",
+                details={
+                    "command_id": command_id,
+                    "step_index": step_index,
+                    "success": result.get('success', False),
+                    "output": result.get('output', '')
+                },
+                command_id=command_id,
+                connection_id=resolved_conn_id,
+                success=result.get('success', False)
+            )
+        
+        step_approvals = db_service.get_command_approvals(command_id)
+        all_responded = len(step_approvals) == len(steps)
+        if all_responded:
+            db_service.update_command_status(command_id, "completed", user_id)
+        
+        return {
+            "command_id": command_id,
+            "step_indices": step_indices,
+            "status": "approved",
+            "message": f"{len(step_indices)} steps approved and executed",
+            "execution_results": [results[step_index] for step_index in step_indices],
+            "all_responded": all_responded,
+            "approval_status": build_approval_status(command_id, steps, step_approvals)
+        }
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception("Bulk step approval failed: %s", e)
+        raise HTTPException(status_code=500, detail=f"Step approval failed: {str(e)}")
+
 @app.get("/api/commands/{command_id}/approval-status")
 async def get_command_approval_status(
     command_id: str,
     request: Request,
-    user_id: str = Depends(require_auth)
+    user_id: str = Depends(require_auth),
+    db_service: DatabaseService = Depends(get_db_service)
 ):
     """Get the approval status of a specific command"""
     try:
-        db = next(get_db())
-        db_service = DatabaseService(db)
-        
         # Get command
         command = db_service.get_command(command_id, user_id)
         if not command:
@@ -852,72 +1030,23 @@ async def get_command_approval_status(
         # Get step approvals
         step_approvals = db_service.get_command_approvals(command_id)
         
-        # Count approval statuses
-        total_steps = len(command.generated_commands) if command.generated_commands else 0
-        approved_steps = 0
-        rejected_steps = 0
-        pending_steps = 0
-        
-        # Create step status array
-        steps = []
-        for i in range(total_steps):
-            step_approval = next((approval for approval in step_approvals if approval.step_index == i), None)
-            
-            if step_approval:
-                status = "approved" if step_approval.approved else "rejected"
-                if step_approval.approved:
-                    approved_steps += 1
-                else:
-                    rejected_steps += 1
-            else:
-                status = "pending"
-                pending_steps += 1
-            
-            step_data = {
-                "step_index": i,
-                "command": command.generated_commands[i].get('command', '') if command.generated_commands else '',
-                "explanation": command.generated_commands[i].get('explanation', '') if command.generated_commands else '',
-                "risk_level": command.generated_commands[i].get('risk_level', 'medium') if command.generated_commands else 'medium',
-                "estimated_time": command.generated_commands[i].get('estimated_time', 'Unknown') if command.generated_commands else 'Unknown',
-                "status": status,
-                "approved": step_approval.approved if step_approval else None,
-                "approved_by": step_approval.user_id if step_approval else None,
-                "reason": step_approval.approval_reason if step_approval else None,
-                "approved_at": step_approval.approved_at.isoformat() if step_approval and step_approval.approved_at else None
-            }
-            steps.append(step_data)
-        
-        can_execute = (rejected_steps == 0 and pending_steps == 0 and approved_steps == total_steps)
-        
-        db.close()
-        
-        return {
-            "command_id": command_id,
-            "total_steps": total_steps,
-            "approved_steps": approved_steps,
-            "rejected_steps": rejected_steps,
-            "pending_steps": pending_steps,
-            "can_execute": can_execute,
-            "steps": steps
-        }
+        return build_approval_status(command_id, command.generated_commands, step_approvals)
         
     except HTTPException:
         raise
     except Exception as e:
-        print(f"[ERROR] Failed to get approval status: {str(e)}")
+        logger.error("Failed to get approval status: %s", e)
         raise HTTPException(status_code=500, detail=f"Failed to get approval status: {str(e)}")
 
 @app.post("/api/commands/{command_id}/execute")
 async def execute_command(
     command_id: str,
     request: Request,
-    user_id: str = Depends(require_auth)
+    user_id: str = Depends(require_auth),
+    db_service: DatabaseService = Depends(get_db_service)
 ):
     """Execute all approved steps of a command"""
     try:
-        db = next(get_db())
-        db_service = DatabaseService(db)
-        
         # Get command
         command = db_service.get_command(command_id, user_id)
         if not command:
@@ -931,25 +1060,22 @@ async def execute_command(
         db_service.update_command_status(command_id, "executing", user_id)
         
         # Get SSH manager and execute commands
-        if user_id not in user_ssh_managers:
+        session = user_sessions.get(user_id)
+        if session is None or session.ssh_manager is None:
             raise HTTPException(status_code=500, detail="SSH manager not found")
         
-        ssh_manager = user_ssh_managers[user_id]
-        
-        # Import CommandExecutor
-        from command_executor import CommandExecutor
+        ssh_manager = session.ssh_manager
         
         # Find the active connection for this command
         connection_found = False
         active_connection_id = None
         
         # Check if command's connection exists in memory
-        if user_id in user_connections:
-            for conn_id, conn_info in user_connections[user_id].items():
-                if conn_info.get('hostname') == command.connection.hostname:
-                    active_connection_id = conn_id
-                    connection_found = True
-                    break
+        for conn_id, conn_info in session.connections.items():
+            if conn_info.get('hostname') == command.connection.hostname:
+                active_connection_id = conn_id
+                connection_found = True
+                break
         
         # If not in memory, try to re-establish connection
         if not connection_found:
@@ -960,19 +1086,21 @@ async def execute_command(
             
             # For now, we'll use the command's original connection_id and hope it's still valid
             active_connection_id = command.connection_id
-            print(f"[DEBUG] Using database connection ID for execution: {active_connection_id}")
+            logger.debug("Using database connection ID for execution: %s", active_connection_id)
         
-        # Create command executor
-        executor = CommandExecutor(ssh_manager, active_connection_id)
+        # Reuse the connection's command executor
+        executor = get_command_executor(user_id, ssh_manager, active_connection_id)
         
         # Execute the commands
-        execution_results = executor.execute_steps(command.generated_commands)
+        execution_results = await asyncio.get_running_loop().run_in_executor(
+            ssh_execution_pool, executor.execute_steps, command.generated_commands
+        )
         
         # Update command with results
         db_service.complete_command(command_id, execution_results)
         
         # Log the execution
-        db_service.log_action(
+        queue_audit_log(
             user_id=user_id,
             action="execute_command",
             details={
@@ -986,8 +1114,6 @@ async def execute_command(
             success=execution_results.get('overall_success', False)
         )
         
-        db.close()
-        
         return {
             "command_id": command_id,
             "status": "completed" if execution_results.get('overall_success') else "failed",
@@ -998,9 +1124,7 @@ async def execute_command(
     except HTTPException:
         raise
     except Exception as e:
-        print(f"[ERROR] Command execution failed: {str(e)}")
-        import traceback
-        print(f"[ERROR] Full traceback: {traceback.format_exc()}")
+        logger.exception("Command execution failed: %s", e)
         
         # Update command status to failed
         try:
@@ -1012,19 +1136,23 @@ async def execute_command(
 
 # Include original endpoints for compatibility
 @app.get("/api/status")
-async def get_connection_status(request: Request, user_id: str = Depends(require_auth)):
+async def get_connection_status(
+    request: Request,
+    user_id: str = Depends(require_auth),
+    db_service: DatabaseService = Depends(get_db_service)
+):
     """Get connection status - check both memory and database"""
-    print(f"[DEBUG] Status check for user {user_id}")
-    print(f"[DEBUG] Memory connections keys: {list(user_connections.keys())}")
+    logger.debug("Status check for user %s", user_id)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Memory connections keys: %s", list(user_sessions))
+    session = user_sessions.get(user_id)
+    memory_connections = session.connections if session is not None else {}
     
     # Get database service to check for persistent connections
     try:
-        db = next(get_db())
-        db_service = DatabaseService(db)
-        
         # Get active connections from database
         db_connections = db_service.get_user_active_connections(user_id)
-        print(f"[DEBUG] Database shows {len(db_connections)} active connections for user {user_id}")
+        logger.debug("Database shows %s active connections for user %s", len(db_connections), user_id)
         
         # Build response format compatible with frontend
         connections = {}
@@ -1040,15 +1168,13 @@ async def get_connection_status(request: Request, user_id: str = Depends(require
             }
         
         # Also check memory connections and merge
-        if user_id in user_connections:
-            print(f"[DEBUG] Also found {len(user_connections[user_id])} memory connections")
-            for conn_id, conn_info in user_connections[user_id].items():
+        if memory_connections:
+            logger.debug("Also found %s memory connections", len(memory_connections))
+            for conn_id, conn_info in memory_connections.items():
                 if conn_id not in connections:  # Don't overwrite database info
                     connections[conn_id] = conn_info
         
-        db.close()
-        
-        print(f"[DEBUG] Returning {len(connections)} total connections")
+        logger.debug("Returning %s total connections", len(connections))
         return {
             "connections": connections,
             "total_connections": len(connections),
@@ -1056,29 +1182,34 @@ async def get_connection_status(request: Request, user_id: str = Depends(require
         }
         
     except Exception as e:
-        print(f"[DEBUG] Database error, falling back to memory: {str(e)}")
+        logger.debug("Database error, falling back to memory: %s", e)
         # Fallback to memory-only if database fails
-    if user_id not in user_connections:
-        return {"connections": {}, "total_connections": 0, "timestamp": datetime.now().isoformat()}
-    
     return {
-        "connections": user_connections[user_id],
-        "total_connections": len(user_connections[user_id]),
+        "connections": memory_connections,
+        "total_connections": len(memory_connections),
         "timestamp": datetime.now().isoformat()
     }
 
 @app.get("/api/ssh/status")
-async def get_ssh_status(request: Request, user_id: str = Depends(require_auth)):
+async def get_ssh_status(
+    request: Request,
+    user_id: str = Depends(require_auth),
+    db_service: DatabaseService = Depends(get_db_service)
+):
     """Get SSH connection status (alias for /api/status for frontend compatibility)"""
     # SESSION-BASED: Update user activity
     update_user_activity(user_id)
     
-    result = await get_connection_status(request, user_id)
-    print(f"[DEBUG] SSH Status for user {user_id}: {result}")
+    result = await get_connection_status(request, user_id, db_service)
+    logger.debug("SSH Status for user %s: %s", user_id, result)
     return result
 
 @app.post("/api/disconnect")
-async def disconnect_ssh(request: Request, user_id: str = Depends(require_auth)):
+async def disconnect_ssh(
+    request: Request,
+    user_id: str = Depends(require_auth),
+    db_service: DatabaseService = Depends(get_db_service)
+):
     """Disconnect SSH connection"""
     try:
         body = await request.json()
@@ -1086,49 +1217,47 @@ async def disconnect_ssh(request: Request, user_id: str = Depends(require_auth))
         
         # SESSION-BASED: If no specific connection_id, disconnect ALL user connections
         if not connection_id:
-            print(f"[DEBUG] No connection_id provided, disconnecting ALL connections for user {user_id}")
+            logger.debug("No connection_id provided, disconnecting ALL connections for user %s", user_id)
             # Disconnect all connections for this user
-            if user_id in user_ssh_managers:
-                ssh_manager = user_ssh_managers[user_id]
-                if user_id in user_connections:
-                    for conn_id in list(user_connections[user_id].keys()):
-                        try:
-                            ssh_manager.disconnect(conn_id)
-                            print(f"[DEBUG] Disconnected connection {conn_id}")
-                        except Exception as e:
-                            print(f"[ERROR] Failed to disconnect {conn_id}: {str(e)}")
-                    user_connections[user_id].clear()
-                del user_ssh_managers[user_id]
+            session = user_sessions.get(user_id)
+            if session is not None:
+                # Detach everything first so concurrent requests never see half-closed connections
+                ssh_manager, connection_ids = session.ssh_manager, list(session.connections)
+                session.ssh_manager = None
+                session.connections.clear()
+                session.alive.clear()
+                session.executors.clear()
+                for agent_connection_id in {*connection_ids, *session.agents}:
+                    forget_agent(user_id, session, agent_connection_id)
+                if ssh_manager is not None:
+                    await disconnect_connections(ssh_manager, connection_ids)
             
             # Update all database connections for this user to disconnected
-            db = next(get_db())
-            db_service = DatabaseService(db)
             db_service.disconnect_all_user_connections(user_id)
-            db.close()
             
             return {"status": "success", "message": "All connections disconnected"}
         
         # Original logic for specific connection_id
-        print(f"[DEBUG] Disconnecting specific connection: {connection_id}")
-        
-        # Get database service
-        db = next(get_db())
-        db_service = DatabaseService(db)
+        logger.debug("Disconnecting specific connection: %s", connection_id)
         
         # Disconnect from SSH manager
-        if user_id in user_ssh_managers:
-            ssh_manager = user_ssh_managers[user_id]
-            ssh_manager.disconnect(connection_id)
+        session = user_sessions.get(user_id)
+        if session is not None:
+            if session.ssh_manager is not None:
+                await asyncio.to_thread(session.ssh_manager.disconnect, connection_id)
+            session.executors.pop(connection_id, None)
+            forget_agent(user_id, session, connection_id)
         
         # Update database
         db_service.disconnect_connection(connection_id)
         
         # Remove from user connections
-        if user_id in user_connections and connection_id in user_connections[user_id]:
-            del user_connections[user_id][connection_id]
+        if session is not None:
+            session.connections.pop(connection_id, None)
+            session.alive.discard(connection_id)
         
         # Log the action
-        db_service.log_action(
+        queue_audit_log(
             user_id=user_id,
             action="disconnect",
             details={"connection_id": connection_id},
@@ -1137,74 +1266,30 @@ async def disconnect_ssh(request: Request, user_id: str = Depends(require_auth))
             user_agent=request.headers.get("user-agent")
         )
         
-        db.close()
-        
         return {"success": True, "message": "Disconnected successfully"}
         
     except Exception as e:
-        print(f"Disconnect error: {str(e)}")
+        logger.error("Disconnect error: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/commands")
 async def list_commands(
     request: Request,
     user_id: str = Depends(require_auth),
+    db_service: DatabaseService = Depends(get_db_service),
     status: Optional[str] = None,
     connection_id: Optional[str] = None,
     limit: int = 50
 ):
     """List commands with safe serialization and proper error handling"""
-    logger.debug(f"list_commands: user_id={user_id}, connection_id={connection_id}, limit={limit}")
+    logger.debug("list_commands: user_id=%s, connection_id=%s, limit=%s", user_id, connection_id, limit)
     
     try:
-        db = next(get_db())
-        db_service = DatabaseService(db)
-        
         # Get commands from database
         commands = db_service.get_user_commands(user_id, limit, status, connection_id)
-        logger.debug(f"list_commands: db returned {len(commands)} rows")
-        
-        # Serialize commands safely - direct field access to avoid SQLAlchemy issues
-        command_list = []
-        for cmd in commands:
-            try:
-                # Direct field access with ONLY FIELDS THAT EXIST in Command model
-                command_dict = {
-                    "id": str(cmd.id) if cmd.id else "",
-                    "connection_id": str(cmd.connection_id) if cmd.connection_id else "",
-                    "request": cmd.request if cmd.request else "",
-                    "priority": cmd.priority if cmd.priority else "normal",
-                    "status": cmd.status if cmd.status else "pending",
-                    "intent": cmd.intent if cmd.intent else "Unknown",
-                    "action": cmd.action if cmd.action else "Unknown", 
-                    "risk_level": cmd.risk_level if cmd.risk_level else "medium",
-                    "explanation": "",  # Frontend expects this field - provide empty string
-                    "created_at": cmd.created_at.isoformat() if cmd.created_at else None,
-                    "approved_at": cmd.approved_at.isoformat() if cmd.approved_at else None,
-                    "executed_at": cmd.executed_at.isoformat() if cmd.executed_at else None,
-                    "completed_at": cmd.completed_at.isoformat() if cmd.completed_at else None,
-                    "generated_commands": cmd.generated_commands if cmd.generated_commands else [],
-                    "execution_results": cmd.execution_results if cmd.execution_results else {
-                        "success": False,
-                        "total_steps": 0,
-                        "successful_steps": 0, 
-                        "failed_steps": 0,
-                        "skipped_steps": 0,
-                        "total_execution_time": 0.0,
-                        "step_results": []
-                    }
-                }
-                command_list.append(command_dict)
-                
-            except Exception as cmd_error:
-                logger.error(f"Failed to serialize command: {str(cmd_error)}")
-                command_list.append({
-                    "id": "error",
-                    "error": f"Serialization failed: {str(cmd_error)}"
-                })
+        logger.debug("list_commands: db returned %s rows", len(commands))
         
-        # Close session after serialization
-        db.close()
+        command_list = [serialize_command(cmd) for cmd in commands]
         
         return {
             "commands": command_list,
@@ -1212,46 +1297,167 @@ async def list_commands(
         }
         
     except Exception as e:
-        logger.error(f"list_commands: exception: {str(e)}\n{traceback.format_exc()}")
+        logger.error("list_commands: exception: %s", e, exc_info=True)
         # Return 500 instead of silent empty - this is critical for debugging!
         raise HTTPException(status_code=500, detail=f"Failed to list commands: {str(e)}")
 
 # Helper functions
+def _persist_command(db_service: DatabaseService, user_id: str, database_connection_id: str,
+                     task_request: TaskRequest, command_plan: Dict[str, Any]):
+    """Create the command record (blocking, run in a worker thread)"""
+    command = db_service.create_command(
+        user_id=user_id,
+        connection_id=database_connection_id,  # Use database connection ID for foreign key
+        request=task_request.request,
+        intent=command_plan.get('intent', 'Unknown'),
+        action=command_plan.get('action', 'Unknown'),
+        risk_level=command_plan.get('risk_level', 'medium'),
+        priority=task_request.priority,
+        generated_commands=command_plan['steps']
+    )
+    return command
+
 async def initialize_agent(user_id: str, connection_id: str):
     """Initialize agent for user and connection"""
     try:
-        ssh_manager = user_ssh_managers[user_id]
+        session = user_sessions[user_id]
         agent = Agent(
             api_key=os.getenv("OPENAI_API_KEY"),
-            ssh_manager=ssh_manager,
+            ssh_manager=session.ssh_manager,
             connection_id=connection_id
         )
         
-        if agent.start():
-            user_agents[user_id][connection_id] = agent
+        # Startup probes the host over SSH, so keep it off the event loop
+        if await asyncio.to_thread(agent.start):
+            session.agents[connection_id] = agent
+            agent_started_at[(user_id, connection_id)] = time.monotonic()
             return agent
         return None
     except Exception as e:
-        print(f"Error creating agent: {e}")
+        logger.error("Error creating agent: %s", e)
         return None
 
+def build_step_result(step_index: int, step_command: Dict[str, Any], result: Dict[str, Any]) -> Dict[str, Any]:
+    """Shape an executor result into the step_results entry stored on the command"""
+    return {
+        "step_index": step_index,
+        "command": step_command.get('command', ''),
+        "success": result.get('success', False),
+        "status": result.get('status', 'unknown'),
+        "output": result.get('output', ''),
+        "stderr": result.get('stderr', ''),
+        "error": result.get('error', ''),
+        "exit_code": result.get('exit_code', -1),
+        "execution_time": result.get('execution_time', 0)
+    }
+
+def group_parallel_steps(step_indices: List[int], steps: List[Dict[str, Any]]) -> List[List[int]]:
+    """Split steps into batches: consecutive steps sharing a parallel_group form one batch, the rest run alone"""
+    batches: List[List[int]] = []
+    previous_group = None
+    for step_index in step_indices:
+        group = steps[step_index].get('parallel_group')
+        if group is not None and group == previous_group:
+            batches[-1].append(step_index)
+        else:
+            batches.append([step_index])
+        previous_group = group
+    return batches
+
+def build_approval_status(command_id: str, generated_commands: Optional[List[Dict[str, Any]]],
+                          step_approvals: List[Any]) -> Dict[str, Any]:
+    """Build the per-step approval status payload in a single pass over the steps"""
+    approvals_by_step = {approval.step_index: approval for approval in step_approvals}
+    counts = {"approved": 0, "rejected": 0, "pending": 0}
+    
+    steps = []
+    for i, step in enumerate(generated_commands or []):
+        step_approval = approvals_by_step.get(i)
+        if step_approval:
+            status = "approved" if step_approval.approved else "rejected"
+        else:
+            status = "pending"
+        counts[status] += 1
+        
+        steps.append({
+            "step_index": i,
+            "command": step.get('command', ''),
+            "explanation": step.get('explanation', ''),
+            "risk_level": step.get('risk_level', 'medium'),
+            "estimated_time": step.get('estimated_time', 'Unknown'),
+            "status": status,
+            "approved": step_approval.approved if step_approval else None,
+            "approved_by": step_approval.user_id if step_approval else None,
+            "reason": step_approval.approval_reason if step_approval else None,
+            "approved_at": step_approval.approved_at.isoformat() if step_approval and step_approval.approved_at else None
+        })
+    
+    total_steps = len(steps)
+    return {
+        "command_id": command_id,
+        "total_steps": total_steps,
+        "approved_steps": counts["approved"],
+        "rejected_steps": counts["rejected"],
+        "pending_steps": counts["pending"],
+        "can_execute": counts["approved"] == total_steps,
+        "steps": steps
+    }
+
+def get_user_ssh_manager(user_id: str) -> Optional[SSHManager]:
+    """Return the user's SSHManager, or None when they have no live session"""
+    session = user_sessions.get(user_id)
+    return session.ssh_manager if session is not None else None
+
+def get_command_executor(user_id: str, ssh_manager: SSHManager, connection_id: str) -> CommandExecutor:
+    """Return the cached CommandExecutor for a connection, creating it on first use"""
+    executors = user_sessions[user_id].executors
+    executor = executors.get(connection_id)
+    if executor is None or executor.ssh_manager is not ssh_manager:
+        executor = executors[connection_id] = CommandExecutor(ssh_manager, connection_id)
+    return executor
+
+async def get_or_initialize_agent(user_id: str, connection_id: str):
+    """Return the connection's recently started agent, or initialize a new one"""
+    key = (user_id, connection_id)
+    async with agent_init_locks[key]:
+        session = user_sessions.get(user_id)
+        agent = session.agents.get(connection_id) if session is not None else None
+        started_at = agent_started_at.get(key)
+        if agent and started_at is not None and time.monotonic() - started_at < AGENT_REUSE_TTL_SECONDS:
+            return agent
+        return await initialize_agent(user_id, connection_id)
+
+def release_llm_slot(plan_future: asyncio.Future):
+    """Done-callback for a plan generation thread: free its LLM slot"""
+    llm_semaphore.release()
+    if not plan_future.cancelled():
+        plan_future.exception()  # Mark a late failure as retrieved once nobody is awaiting it
+
 async def generate_command_plan(user_id: str, connection_id: str, request: str):
     """Generate command plan using agent"""
-    if user_id not in user_agents or connection_id not in user_agents[user_id]:
+    session = user_sessions.get(user_id)
+    agent = session.agents.get(connection_id) if session is not None else None
+    if agent is None:
         raise HTTPException(status_code=500, detail="Agent not found")
     
-    agent = user_agents[user_id][connection_id]
-    
     if not hasattr(agent, 'command_generator') or agent.command_generator is None:
         raise HTTPException(status_code=500, detail="Agent command generator not initialized")
     
+    # A timed-out worker thread can't be cancelled, so the slot is released when the
+    # thread finishes rather than when this request gives up on it
+    await llm_semaphore.acquire()
+    plan_future = asyncio.ensure_future(asyncio.to_thread(agent.command_generator.generate_commands, request))
+    plan_future.add_done_callback(release_llm_slot)
     try:
-        command_plan = agent.command_generator.generate_commands(request)
-        if not command_plan or 'steps' not in command_plan:
-            raise HTTPException(status_code=422, detail="Could not generate commands")
-        return command_plan
+        command_plan = await asyncio.wait_for(asyncio.shield(plan_future), timeout=LLM_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Command generation timed out")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Command generation failed: {str(e)}")
+    
+    if not command_plan or 'steps' not in command_plan:
+        raise HTTPException(status_code=422, detail="Could not generate commands")
+    return command_plan
 
 @app.get("/")
 async def root():
@@ -1268,7 +1474,8 @@ async def root():
         ],
         "new_endpoints": {
             "POST /api/commands/{id}/approve-step": "Approve/reject individual command steps",
-            "GET /api/health": "Enhanced health check with database status"
+            "GET /api/health": "Enhanced health check with database status",
+            "GET /api/health/deep": "Uncached health check that always probes the database"
         }
     }
 
@@ -1276,35 +1483,32 @@ async def root():
 async def execute_command_immediately(
     command_id: str,
     request: Request,
-    user_id: str = Depends(require_auth)
+    user_id: str = Depends(require_auth),
+    db_service: DatabaseService = Depends(get_db_service)
 ):
     """Execute command immediately via SSH - DIRECT EXECUTION (FIXED VERSION)"""
-    print(f"[DEBUG] ===== EXECUTE IMMEDIATELY CALLED =====")
-    print(f"[DEBUG] Command ID: {command_id}")
-    print(f"[DEBUG] User ID: {user_id}")
+    logger.debug("===== EXECUTE IMMEDIATELY CALLED =====")
+    logger.debug("Command ID: %s", command_id)
+    logger.debug("User ID: %s", user_id)
     
     # SESSION-BASED: Update user activity
     update_user_activity(user_id)
     
-    # Get database service
-    db = next(get_db())
-    db_service = DatabaseService(db)
-    
     try:
         # 1) Load command
         command = db_service.get_command(command_id, user_id)
         if not command:
             raise HTTPException(status_code=404, detail="Command not found")
         
-        print(f"[DEBUG] Found command: {command.request}")
-        print(f"[DEBUG] Generated commands: {command.generated_commands}")
+        logger.debug("Found command: %s", command.request)
+        logger.debug("Generated commands: %s", command.generated_commands)
         
         # 2) Resolve active connection (fix connection ID mismatch)
         try:
             resolved_conn_id = resolve_active_connection_id(user_id, command.connection_id)
-            print(f"[DEBUG] Resolved connection ID: {resolved_conn_id}")
+            logger.debug("Resolved connection ID: %s", resolved_conn_id)
         except HTTPException as e:
-            print(f"[ERROR] Connection resolution failed: {e.detail}")
+            logger.error("Connection resolution failed: %s", e.detail)
             db_service.update_command_status(command_id, "failed", user_id)
             raise
         
@@ -1312,25 +1516,26 @@ async def execute_command_immediately(
         persist_connection_remap(db_service, command_id, resolved_conn_id, user_id)
         
         # 4) Get SSH manager
-        ssh_manager = user_ssh_managers.get(user_id)
+        ssh_manager = get_user_ssh_manager(user_id)
         if not ssh_manager:
-            print(f"[ERROR] SSH manager not found for user {user_id}")
+            logger.error("SSH manager not found for user %s", user_id)
             db_service.update_command_status(command_id, "failed", user_id)
             raise HTTPException(status_code=440, detail="SSH session expired. Please reconnect.")
         
         # 5) Mark command as running
-        print(f"[DEBUG] Marking command as running...")
+        logger.debug("Marking command as running...")
         db_service.update_command_status(command_id, "running", user_id)
         
-        # 6) Create CommandExecutor with BOTH parameters (FIX!)
-        print(f"[DEBUG] Creating CommandExecutor with ssh_manager and connection_id: {resolved_conn_id}")
-        from command_executor import CommandExecutor
-        executor = CommandExecutor(ssh_manager, resolved_conn_id)
+        # 6) Get the CommandExecutor for ssh_manager and connection_id
+        logger.debug("Getting CommandExecutor with ssh_manager and connection_id: %s", resolved_conn_id)
+        executor = get_command_executor(user_id, ssh_manager, resolved_conn_id)
         
         # 7) ACTUALLY EXECUTE THE COMMANDS (this was missing!)
-        print(f"[DEBUG] Starting command execution...")
-        execution_results = executor.execute_steps(command.generated_commands)
-        print(f"[DEBUG] ✅ Execution completed! Results: {execution_results}")
+        logger.debug("Starting command execution...")
+        execution_results = await asyncio.get_running_loop().run_in_executor(
+            ssh_execution_pool, executor.execute_steps, command.generated_commands
+        )
+        logger.debug("✅ Execution completed! Results: %s", execution_results)
         
         # 8) Update command with results and final status
         exit_code = 0 if execution_results.get('success', False) else 1
@@ -1339,10 +1544,10 @@ async def execute_command_immediately(
         db_service.complete_command(command_id, execution_results)
         db_service.update_command_status(command_id, final_status, user_id)
         
-        print(f"[DEBUG] Command marked as {final_status}")
+        logger.debug("Command marked as %s", final_status)
         
         # 9) Log the execution
-        db_service.log_action(
+        queue_audit_log(
             user_id=user_id,
             action="execute_command_immediately",
             details={
@@ -1369,20 +1574,34 @@ async def execute_command_immediately(
     except HTTPException:
         raise
     except Exception as e:
-        print(f"[ERROR] Immediate execution failed: {str(e)}")
-        import traceback
-        print(f"[ERROR] Full traceback: {traceback.format_exc()}")
+        logger.exception("Immediate execution failed: %s", e)
         
         # Update command status to failed
         try:
             db_service.update_command_status(command_id, "failed", user_id)
         except Exception as db_error:
-            print(f"[ERROR] Failed to update command status: {db_error}")
+            logger.error("Failed to update command status: %s", db_error)
             
         raise HTTPException(status_code=500, detail=f"Immediate execution failed: {str(e)}")
-    finally:
-        db.close()
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run("api_server_v2:app", host=DEFAULT_HOST, port=DEFAULT_PORT, reload=True)
+    try:
+        import uvloop  # noqa: F401 - shipped with uvicorn[standard]
+        loop = "uvloop"
+    except ImportError:
+        loop = "asyncio"
+    from uvicorn.config import LOGGING_CONFIG
+    # INFO by default so the per-request logger.debug calls are no-ops. Passed as log_config
+    # because uvicorn applies it in the serving process, including the reload child
+    log_level = os.getenv("LOG_LEVEL", "INFO").upper()
+    log_config = {**LOGGING_CONFIG, "root": {"handlers": ["default"], "level": log_level}}
+    uvicorn.run(
+        "api_server_enhanced:app",
+        host=DEFAULT_HOST,
+        port=DEFAULT_PORT,
+        reload=os.getenv(ENV_DEV_MODE) == "1",
+        loop=loop,
+        log_config=log_config,
+        log_level=log_level.lower()
+    )
@@ -6,11 +6,13 @@ Session-based storage - all data persists only while backend is running
 
 from fastapi import FastAPI, HTTPException, Header, Request, Depends
 from starlette.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel
 import os
 from datetime import datetime
 from typing import Dict, Any, Optional, List
 import asyncio
+import traceback
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
@@ -40,7 +42,8 @@ STATUS_COMPLETED = "completed"
 app = FastAPI(
     title="Otium AI Agent API - In-Memory Version",
     description="AI-powered system administration with session-based in-memory storage",
-    version="3.0.0"
+    version="3.0.0",
+    default_response_class=ORJSONResponse
 )
 
 # CORS Configuration - Local development only
@@ -748,7 +751,6 @@ async def initialize_agent(user_id: str, connection_id: str):
             return None
     except Exception as e:
         print(f"[ERROR] Agent creation failed: {e}")
-        import traceback
         traceback.print_exc()
         return None
 
@@ -4,6 +4,7 @@ Command Executor for Otium AI Agent - Phase 1 Simplified
 Handles command execution and basic safety checks via SSH
 """
 
+import re
 import time
 from typing import Dict, Any, List, Optional
 from datetime import datetime
@@ -12,6 +13,45 @@ from datetime import datetime
 class CommandExecutor:
     """Handles command execution with basic safety checks via SSH"""
     
+    # Basic dangerous patterns for Phase 1
+    DANGEROUS_PATTERNS = (
+        # File system destruction
+        'rm -rf /',
+        'rm -rf /etc',
+        'rm -rf /var',
+        'rm -rf /usr',
+        'rm -rf /boot',
+        'rm -rf /home',
+        
+        # Disk operations
+        'dd if=/dev/',
+        'mkfs',
+        'fdisk',
+        'parted',
+        
+        # Critical service operations
+        'systemctl stop sshd',
+        'systemctl disable sshd',
+        'systemctl stop network',
+        'systemctl stop firewalld',
+        
+        # Network (dangerous)
+        'iptables -F',
+        'iptables --flush',
+        'ip link set down',
+        'ifconfig down',
+        
+        # User management (dangerous)
+        'userdel -r root',
+        'passwd -d root',
+        
+        # Process management (dangerous)
+        'killall -9',
+        'kill -9 1',
+    )
+    # One case-insensitive alternation scans a command for every pattern in a single pass
+    _DANGEROUS_RE = re.compile("|".join(re.escape(p) for p in DANGEROUS_PATTERNS), re.IGNORECASE)
+    
     def __init__(self, ssh_manager, connection_id):
         if ssh_manager is None:
             raise ValueError("ssh_manager is required")
@@ -19,43 +59,6 @@ class CommandExecutor:
             raise ValueError("connection_id is required")
         self.ssh_manager = ssh_manager
         self.connection_id = connection_id
-        
-        # Basic dangerous patterns for Phase 1
-        self.dangerous_patterns = [
-            # File system destruction
-            'rm -rf /',
-            'rm -rf /etc',
-            'rm -rf /var',
-            'rm -rf /usr',
-            'rm -rf /boot',
-            'rm -rf /home',
-            
-            # Disk operations
-            'dd if=/dev/',
-            'mkfs',
-            'fdisk',
-            'parted',
-            
-            # Critical service operations
-            'systemctl stop sshd',
-            'systemctl disable sshd',
-            'systemctl stop network',
-            'systemctl stop firewalld',
-            
-            # Network (dangerous)
-            'iptables -F',
-            'iptables --flush',
-            'ip link set down',
-            'ifconfig down',
-            
-            # User management (dangerous)
-            'userdel -r root',
-            'passwd -d root',
-            
-            # Process management (dangerous)
-            'killall -9',
-            'kill -9 1',
-        ]
     
     def set_connection_id(self, connection_id: str):
         """Set the SSH connection ID for command execution - DEPRECATED, use constructor"""
@@ -247,10 +250,4 @@ class CommandExecutor:
     
     def _is_dangerous_command(self, command: str) -> bool:
         """Check if command contains dangerous patterns"""
-        command_lower = command.lower()
-        
-        for pattern in self.dangerous_patterns:
-            if pattern.lower() in command_lower:
-                return True
-        
-        return False
\ No newline at end of file
+        return self._DANGEROUS_RE.search(command) is not None
\ No newline at end of file
@@ -4,17 +4,33 @@ Command Generator for Otium AI Agent - Phase 1 Simplified (OpenAI Only)
 Generates appropriate commands based on system context and user requests
 """
 
+import hashlib
 import json
+import logging
+import re
 import subprocess
 import os
 from typing import Dict, Any, List, Optional
 from openai import OpenAI
 
+logger = logging.getLogger(__name__)
+
 # Configuration constants
 DEFAULT_TIMEOUT = 5
 DEFAULT_OPENAI_MODEL = "gpt-3.5-turbo"
 DEFAULT_OPENAI_MAX_TOKENS = 1000
 DEFAULT_OPENAI_TEMPERATURE = 0.1
+# Wall-clock budget (seconds) for one OpenAI request; a stalled call falls back to a simple plan
+DEFAULT_OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "30"))
+# Transient failures (connection errors, timeouts, 429/5xx) are retried by the SDK with
+# capped exponential backoff
+DEFAULT_OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "3"))
+# Worst case for one generate call: every attempt times out, plus the SDK's retry backoff
+# (0.5s doubling, capped at 8s)
+OPENAI_CALL_BUDGET_SECONDS = (
+    DEFAULT_OPENAI_TIMEOUT * (DEFAULT_OPENAI_MAX_RETRIES + 1)
+    + sum(min(0.5 * 2 ** attempt, 8.0) for attempt in range(DEFAULT_OPENAI_MAX_RETRIES))
+)
 
 # Fast pattern matching keywords
 FAST_PATTERNS = {
@@ -49,6 +65,23 @@ SERVICE_MAPPINGS = {
     }
 }
 
+# One OpenAI client (and its HTTP connection pool) per API key, shared by every generator.
+# Keyed by a digest so the raw key is not held in the cache.
+_OPENAI_CLIENTS: Dict[str, OpenAI] = {}
+
+
+def get_openai_client(api_key: str) -> OpenAI:
+    """Return the shared OpenAI client for an API key, creating it on first use"""
+    key = hashlib.sha256(api_key.encode()).hexdigest()
+    client = _OPENAI_CLIENTS.get(key)
+    if client is None:
+        client = _OPENAI_CLIENTS[key] = OpenAI(
+            api_key=api_key,
+            timeout=DEFAULT_OPENAI_TIMEOUT,
+            max_retries=DEFAULT_OPENAI_MAX_RETRIES
+        )
+    return client
+
 
 class CommandGenerator:
     """Generates appropriate commands based on system context - Phase 1 Simplified (OpenAI Only)"""
@@ -57,8 +90,12 @@ class CommandGenerator:
         self.system_context = system_context
         self.api_key = api_key
         
+        # The system prompt depends only on the system context; building it once keeps the
+        # prefix byte-identical across requests so OpenAI's automatic prompt caching applies
+        self._system_prompt = None
+        
         if api_key:
-            self.openai_client = OpenAI(api_key=api_key)
+            self.openai_client = get_openai_client(api_key)
         else:
             self.openai_client = None
     
@@ -94,7 +131,9 @@ class CommandGenerator:
             print("⚠️  No OpenAI API key provided, using fallback")
             return self._create_simple_fallback(user_request)
         
-        system_prompt = self._create_system_prompt()
+        if self._system_prompt is None:
+            self._system_prompt = self._create_system_prompt()
+        system_prompt = self._system_prompt
         user_prompt = self._create_user_prompt(user_request)
         
         # Call OpenAI API
@@ -111,7 +150,8 @@ class CommandGenerator:
         os_family = self.system_context.get('os_family', 'unknown')
         package_manager = self.system_context.get('package_manager', 'unknown')
         service_manager = self.system_context.get('service_manager', 'unknown')
-        available_tools = self.system_context.get('available_tools', [])
+        # Sorted so the prompt text does not depend on detection order
+        available_tools = sorted(self.system_context.get('available_tools', []))
         memory_available = self.system_context.get('memory_available', 'Unknown')
         disk_available = self.system_context.get('disk_available', 'Unknown')
         
@@ -145,6 +185,7 @@ OUTPUT FORMAT REQUIREMENTS:
 - Do not include any explanatory text, comments, or markdown formatting
 - Ensure all JSON is properly formatted and valid
 - Include all required fields in the JSON response
+- Steps that do not depend on each other may share an integer "parallel_group" so they can run concurrently; omit it otherwise
 
 Analyze the user's request and respond with a JSON object containing executable steps:
 
@@ -188,10 +229,19 @@ Generate appropriate commands for this specific system. Consider the system cont
                 temperature=DEFAULT_OPENAI_TEMPERATURE,
                 max_tokens=DEFAULT_OPENAI_MAX_TOKENS
             )
+            self._log_prompt_cache_usage(response)
             return response.choices[0].message.content
         except Exception as e:
             return f"Error calling OpenAI: {e}"
     
+    def _log_prompt_cache_usage(self, response) -> None:
+        """Report how much of the prompt was served from OpenAI's prefix cache"""
+        usage = getattr(response, 'usage', None)
+        details = getattr(usage, 'prompt_tokens_details', None)
+        cached_tokens = getattr(details, 'cached_tokens', None)
+        if cached_tokens is not None:
+            logger.debug("Prompt cache: %s/%s prompt tokens cached", cached_tokens, usage.prompt_tokens)
+    
     def _parse_and_validate_ai_response(self, response: str, user_request: str) -> Dict[str, Any]:
         """Parse AI response and validate commands"""
         try:
@@ -213,7 +263,6 @@ Generate appropriate commands for this specific system. Consider the system cont
     
     def _extract_json_from_response(self, response: str) -> Optional[Dict[str, Any]]:
         """Extract JSON from AI response"""
-        import re
         json_match = re.search(r'\{.*\}', response, re.DOTALL)
         if json_match:
             json_str = json_match.group()
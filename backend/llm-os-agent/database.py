@@ -7,6 +7,7 @@ Uses SQLAlchemy with PostgreSQL for enterprise-grade persistence
 from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime, Boolean, JSON, ForeignKey, DECIMAL
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
+from contextlib import contextmanager
 from datetime import datetime
 import os
 import uuid
@@ -64,7 +65,7 @@ class Command(Base):
     status = Column(String, default="pending_approval")  # pending_approval, approved, executing, completed, failed, rejected
     generated_commands = Column(JSON)  # Array of command steps (legacy)
     execution_results = Column(JSON)  # Results from execution
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
     approved_at = Column(DateTime)
     executed_at = Column(DateTime)
     completed_at = Column(DateTime)
@@ -121,7 +122,7 @@ class AuditLog(Base):
     details = Column(JSON)  # Additional context
     system_state_before = Column(JSON)  # System state before action
     system_state_after = Column(JSON)  # System state after action
-    timestamp = Column(DateTime, default=datetime.utcnow)
+    timestamp = Column(DateTime, default=datetime.utcnow, index=True)
     ip_address = Column(String)
     user_agent = Column(String)
     success = Column(Boolean)
@@ -215,7 +216,13 @@ if not DATABASE_URL:
     DATABASE_URL = "sqlite:///./otium.db"
     print("⚠️  DATABASE_URL not set, using SQLite for development")
 
-engine = create_engine(DATABASE_URL)
+# Keep a large compiled-statement cache so repeated queries skip SQL compilation
+engine_options = {"query_cache_size": 1200}
+if not DATABASE_URL.startswith("sqlite"):
+    # Keep a small warm pool of validated connections for server databases
+    engine_options.update(pool_pre_ping=True, pool_size=5, max_overflow=5)
+
+engine = create_engine(DATABASE_URL, **engine_options)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine, expire_on_commit=False)
 
 def create_tables():
@@ -230,6 +237,18 @@ def get_db():
     finally:
         db.close()
 
+@contextmanager
+def db_session(existing=None):
+    """Context manager for a database session; reuses `existing` without closing it"""
+    if existing is not None:
+        yield existing
+        return
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
 def init_database():
     """Initialize database with tables"""
     create_tables()
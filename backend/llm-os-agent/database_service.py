@@ -4,12 +4,63 @@ Database service layer for Otium AI Agent
 Provides high-level database operations with business logic
 """
 
+from sqlalchemy import insert, select, text
 from sqlalchemy.orm import Session
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Set
 from datetime import datetime
+import json
 import uuid
 from database import User, Connection, Command, CommandApproval, AuditLog, SystemCheckpoint
 
+# Every optional audit column, so bulk-inserted rows share one parameter set
+AUDIT_LOG_DEFAULTS = {
+    "command_id": None,
+    "connection_id": None,
+    "details": None,
+    "system_state_before": None,
+    "system_state_after": None,
+    "ip_address": None,
+    "user_agent": None,
+    "success": True,
+    "error_message": None,
+}
+
+# Aggregated execution_results, read as :initial when a command has none yet
+EXECUTION_RESULTS_EXPR = "coalesce(execution_results::jsonb, CAST(:initial AS jsonb))"
+
+# Appends a batch of step results and bumps the counters in a single statement. Every term reads the
+# row's current value, so concurrent appends serialize on the row lock instead of losing updates
+APPEND_STEP_RESULT_SQL = text(f"""
+UPDATE commands SET
+    executed_at = coalesce(executed_at, :now),
+    execution_results = ({EXECUTION_RESULTS_EXPR} || jsonb_build_object(
+        'step_results', coalesce({EXECUTION_RESULTS_EXPR} -> 'step_results', '[]'::jsonb) || CAST(:step_results AS jsonb),
+        'successful_steps', coalesce(({EXECUTION_RESULTS_EXPR} ->> 'successful_steps')::int, 0) + :success_delta,
+        'failed_steps', coalesce(({EXECUTION_RESULTS_EXPR} ->> 'failed_steps')::int, 0) + :failure_delta,
+        'total_execution_time', coalesce(({EXECUTION_RESULTS_EXPR} ->> 'total_execution_time')::float, 0) + :execution_time,
+        'success', CASE
+            WHEN coalesce(({EXECUTION_RESULTS_EXPR} ->> 'successful_steps')::int, 0) + :success_delta
+               + coalesce(({EXECUTION_RESULTS_EXPR} ->> 'failed_steps')::int, 0) + :failure_delta
+               = coalesce(({EXECUTION_RESULTS_EXPR} ->> 'total_steps')::int, :total_steps)
+            THEN to_jsonb(coalesce(({EXECUTION_RESULTS_EXPR} ->> 'failed_steps')::int, 0) + :failure_delta = 0)
+            ELSE coalesce({EXECUTION_RESULTS_EXPR} -> 'success', 'null'::jsonb)
+        END
+    ))::json
+WHERE id = :command_id
+""")
+
+def empty_execution_results(total_steps: int) -> Dict[str, Any]:
+    """Aggregated execution_results for a command before any step has run"""
+    return {
+        "success": None,
+        "total_steps": total_steps,
+        "successful_steps": 0,
+        "failed_steps": 0,
+        "skipped_steps": 0,
+        "total_execution_time": 0,
+        "step_results": []
+    }
+
 class DatabaseService:
     def __init__(self, db: Session):
         self.db = db
@@ -97,6 +148,16 @@ class DatabaseService:
             Connection.disconnected_at.is_(None)
         ).all()
     
+    def get_user_active_connection_ids(self, user_id: str) -> Set[str]:
+        """Get the ids of a user's active/connected connections without loading ORM objects"""
+        return set(self.db.execute(
+            select(Connection.id).where(
+                Connection.user_id == user_id,
+                Connection.status == "connected",
+                Connection.disconnected_at.is_(None)
+            )
+        ).scalars())
+    
     def get_connection(self, connection_id: str, user_id: str) -> Optional[Connection]:
         """Get specific connection for user"""
         return self.db.query(Connection).filter(
@@ -208,6 +269,54 @@ class DatabaseService:
             self.db.commit()
             self.db.refresh(command)
     
+    def append_step_result_atomic(self, command_id: str, step_result: Dict[str, Any], total_steps: int):
+        """Append one step result to a command's execution_results and update its counters"""
+        self.append_step_results_atomic(command_id, [step_result], total_steps)
+    
+    def append_step_results_atomic(self, command_id: str, step_results: List[Dict[str, Any]], total_steps: int):
+        """Append step results to a command's execution_results and update its counters, in one commit.
+        
+        PostgreSQL does this in one UPDATE; other databases read-modify-write under a row lock.
+        """
+        if not step_results:
+            return
+        success_delta = sum(1 for step_result in step_results if step_result.get("success", False))
+        failure_delta = len(step_results) - success_delta
+        execution_time = sum(step_result.get("execution_time", 0) or 0 for step_result in step_results)
+        
+        if self.db.get_bind().dialect.name == "postgresql":
+            self.db.execute(APPEND_STEP_RESULT_SQL, {
+                "command_id": command_id,
+                "step_results": json.dumps(step_results),
+                "initial": json.dumps(empty_execution_results(total_steps)),
+                "success_delta": success_delta,
+                "failure_delta": failure_delta,
+                "execution_time": execution_time,
+                "total_steps": total_steps,
+                "now": datetime.utcnow()
+            })
+            self.db.commit()
+            return
+        
+        command = self.db.query(Command).filter(Command.id == command_id).with_for_update().first()
+        if not command:
+            return
+        # Build a new dict so the JSON column registers the change
+        results = dict(command.execution_results or empty_execution_results(total_steps))
+        results["step_results"] = [*results.get("step_results", []), *step_results]
+        results["successful_steps"] = results.get("successful_steps", 0) + success_delta
+        results["failed_steps"] = results.get("failed_steps", 0) + failure_delta
+        results["total_execution_time"] = results.get("total_execution_time", 0) + execution_time
+        
+        # All steps executed - determine overall success
+        if results["successful_steps"] + results.get("failed_steps", 0) == results.get("total_steps", 0):
+            results["success"] = results.get("failed_steps", 0) == 0
+        
+        command.execution_results = results
+        if not command.executed_at:
+            command.executed_at = datetime.utcnow()
+        self.db.commit()
+    
     # Command approval management (step-by-step like Cursor)
     def create_step_approval(self, command_id: str, user_id: str, step_index: int, 
                            approved: bool, reason: str = None) -> CommandApproval:
@@ -307,6 +416,13 @@ class DatabaseService:
         self.db.add(audit_log)
         self.db.commit()
     
+    def bulk_log_actions(self, entries: List[Dict[str, Any]]):
+        """Write many audit log entries (log_action keyword dicts) in one INSERT and commit"""
+        if not entries:
+            return
+        self.db.execute(insert(AuditLog), [{**AUDIT_LOG_DEFAULTS, **entry} for entry in entries])
+        self.db.commit()
+    
     def get_audit_logs(self, user_id: str = None, start_date: datetime = None, 
                       end_date: datetime = None, limit: int = 100) -> List[AuditLog]:
         """Get audit logs with optional filtering"""
@@ -5,11 +5,20 @@ Handles encryption/decryption of sensitive data like SSH credentials
 """
 
 from cryptography.fernet import Fernet
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
 import base64
 import os
 import json
 from typing import Dict, Any, Optional
 
+# New ciphertexts are AES-256-GCM: version byte + nonce + ciphertext/tag. Fernet tokens
+# (written before the switch) always start with 0x80, so the version byte tells them apart
+AESGCM_VERSION = b"\x02"
+AESGCM_NONCE_SIZE = 12
+AESGCM_KEY_INFO = b"otium-secrets-aesgcm"
+
 class SecretsManager:
     def __init__(self):
         # Get encryption key from environment
@@ -19,30 +28,42 @@ class SecretsManager:
             encryption_key = Fernet.generate_key().decode()
             print(f"⚠️  Generated new encryption key. Set OTIUM_ENCRYPTION_KEY={encryption_key} in production")
         
+        # Fernet stays for decrypting legacy values; the AES-GCM key is derived from the same secret
         self.cipher = Fernet(encryption_key.encode())
+        self.aead = AESGCM(HKDF(
+            algorithm=hashes.SHA256(),
+            length=32,
+            salt=None,
+            info=AESGCM_KEY_INFO
+        ).derive(base64.urlsafe_b64decode(encryption_key)))
+    
+    def _encrypt(self, data: bytes) -> str:
+        """Encrypt bytes and return a base64 string for database storage"""
+        nonce = os.urandom(AESGCM_NONCE_SIZE)
+        return base64.b64encode(AESGCM_VERSION + nonce + self.aead.encrypt(nonce, data, None)).decode()
+    
+    def _decrypt(self, encrypted: str) -> bytes:
+        """Decrypt a base64 string produced by _encrypt, or a legacy Fernet token"""
+        encrypted_data = base64.b64decode(encrypted.encode())
+        if encrypted_data[:1] == AESGCM_VERSION:
+            nonce = encrypted_data[1:1 + AESGCM_NONCE_SIZE]
+            return self.aead.decrypt(nonce, encrypted_data[1 + AESGCM_NONCE_SIZE:], None)
+        return self.cipher.decrypt(encrypted_data)
     
     def encrypt_credentials(self, credentials: Dict[str, Any]) -> str:
         """Encrypt SSH credentials for storage"""
         try:
-            # Convert credentials to JSON string
+            # Convert credentials to JSON string and encrypt
             credentials_json = json.dumps(credentials)
-            
-            # Encrypt the credentials
-            encrypted_data = self.cipher.encrypt(credentials_json.encode())
-            
-            # Return base64 encoded string for database storage
-            return base64.b64encode(encrypted_data).decode()
+            return self._encrypt(credentials_json.encode())
         except Exception as e:
             raise Exception(f"Failed to encrypt credentials: {str(e)}")
     
     def decrypt_credentials(self, encrypted_credentials: str) -> Dict[str, Any]:
         """Decrypt SSH credentials from storage"""
         try:
-            # Decode from base64
-            encrypted_data = base64.b64decode(encrypted_credentials.encode())
-            
             # Decrypt the credentials
-            decrypted_data = self.cipher.decrypt(encrypted_data)
+            decrypted_data = self._decrypt(encrypted_credentials)
             
             # Parse JSON and return
             return json.loads(decrypted_data.decode())
@@ -52,34 +73,28 @@ class SecretsManager:
     def encrypt_api_key(self, api_key: str) -> str:
         """Encrypt API keys for storage"""
         try:
-            encrypted_data = self.cipher.encrypt(api_key.encode())
-            return base64.b64encode(encrypted_data).decode()
+            return self._encrypt(api_key.encode())
         except Exception as e:
             raise Exception(f"Failed to encrypt API key: {str(e)}")
     
     def decrypt_api_key(self, encrypted_api_key: str) -> str:
         """Decrypt API keys from storage"""
         try:
-            encrypted_data = base64.b64decode(encrypted_api_key.encode())
-            decrypted_data = self.cipher.decrypt(encrypted_data)
-            return decrypted_data.decode()
+            return self._decrypt(encrypted_api_key).decode()
         except Exception as e:
             raise Exception(f"Failed to decrypt API key: {str(e)}")
     
     def encrypt_text(self, text: str) -> str:
         """Encrypt any text data"""
         try:
-            encrypted_data = self.cipher.encrypt(text.encode())
-            return base64.b64encode(encrypted_data).decode()
+            return self._encrypt(text.encode())
         except Exception as e:
             raise Exception(f"Failed to encrypt text: {str(e)}")
     
     def decrypt_text(self, encrypted_text: str) -> str:
         """Decrypt any text data"""
         try:
-            encrypted_data = base64.b64decode(encrypted_text.encode())
-            decrypted_data = self.cipher.decrypt(encrypted_data)
-            return decrypted_data.decode()
+            return self._decrypt(encrypted_text).decode()
         except Exception as e:
             raise Exception(f"Failed to decrypt text: {str(e)}")
     
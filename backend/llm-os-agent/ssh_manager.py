@@ -15,8 +15,8 @@ DEFAULT_SSH_PORT = 22
 DEFAULT_CONNECTION_TIMEOUT = 10
 DEFAULT_COMMAND_TIMEOUT = 300
 DEFAULT_PING_TIMEOUT = 5
+DEFAULT_KEEPALIVE_INTERVAL = 30  # Seconds between transport keepalives on idle connections
 DEFAULT_CONNECTION_TEST_COMMAND = 'echo "Connection test"'
-DEFAULT_PING_COMMAND = 'echo "ping"'
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -109,6 +109,10 @@ class SSHManager:
             banner_timeout=30,
             auth_timeout=30
         )
+        # Keep idle sessions alive so stored connections are reused instead of re-handshaking
+        transport = ssh_client.get_transport()
+        if transport:
+            transport.set_keepalive(DEFAULT_KEEPALIVE_INTERVAL)
     
     def _test_connection(self, ssh_client: paramiko.SSHClient) -> None:
         """Test SSH connection with a simple command"""
@@ -190,18 +194,14 @@ class SSHManager:
     
     def is_connection_alive(self, connection_id: str) -> bool:
         """Check if SSH connection is still alive"""
-        if connection_id not in self.connections:
+        connection = self.connections.get(connection_id)
+        if connection is None:
             return False
         
-        connection = self.connections[connection_id]
-        
-        try:
-            # Try to execute a simple command to test connection
-            stdin, stdout, stderr = connection['ssh_client'].exec_command(DEFAULT_PING_COMMAND, timeout=DEFAULT_PING_TIMEOUT)
-            exit_code = stdout.channel.recv_exit_status()
-            return exit_code == 0
-        except Exception:
-            return False
+        # Keepalives make the transport notice dropped peers, so its state is
+        # authoritative without a round-trip to the server
+        transport = connection['ssh_client'].get_transport()
+        return transport is not None and transport.is_active()
     
     def get_connection_info(self, connection_id: str) -> Optional[Dict[str, Any]]:
         """Get information about a specific connection"""
@@ -75,20 +75,22 @@ class SSHSystemDetector:
                 result = self._run_ssh_command(f"cat {release_file}")
                 if result['success']:
                     content = result['stdout'].strip()
+                    # Lowercase once and reuse for every family check
+                    content_lower = content.lower()
                     
-                    if "redhat" in release_file.lower() or "centos" in content.lower():
+                    if "redhat" in release_file or "centos" in content_lower:
                         return {
                             "os_name": "Red Hat Enterprise Linux",
                             "os_version": content,
                             "os_family": "rhel"
                         }
-                    elif "debian" in content.lower() or "ubuntu" in content.lower():
+                    elif "debian" in content_lower or "ubuntu" in content_lower:
                         return {
                             "os_name": "Debian/Ubuntu",
                             "os_version": content,
                             "os_family": "debian"
                         }
-                    elif "suse" in content.lower() or "opensuse" in content.lower():
+                    elif "suse" in content_lower:
                         return {
                             "os_name": "SUSE Linux",
                             "os_version": content,
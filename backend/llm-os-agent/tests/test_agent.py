@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+"""
+Unit tests for agent safety checks
+"""
+
+import pytest
+import sys
+import os
+from unittest.mock import Mock
+
+# Add parent directory to path to import modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agent import Agent
+
+@pytest.fixture
+def agent():
+    """Agent with a mocked SSH manager"""
+    return Agent(api_key="test-key", ssh_manager=Mock(), connection_id="conn_test")
+
+def test_dangerous_operation_detected(agent):
+    """Dangerous patterns are matched regardless of case"""
+    plan = {'steps': [{'command': 'ls -la'}, {'command': 'IPTABLES -F'}]}
+    assert agent._is_dangerous_operation(plan) == True
+    assert agent._is_dangerous_operation({'steps': [{'command': 'sudo rm -rf /var/log'}]}) == True
+
+def test_safe_operation_not_flagged(agent):
+    """Ordinary commands and empty plans are not flagged"""
+    assert agent._is_dangerous_operation({'steps': [{'command': 'df -h'}, {}]}) == False
+    assert agent._is_dangerous_operation({}) == False
+    assert agent._is_dangerous_operation({'steps': [{'command': 'mkfs /dev/sdb', 'skip': True}]}) == False
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the in-memory API server
+"""
+
+import pytest
+import sys
+import os
+
+# Add parent directory to path to import modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.testclient import TestClient
+import api_server as server
+
+@pytest.fixture
+def client():
+    """Create a test client for the API server"""
+    return TestClient(server.app)
+
+def test_root_head_matches_get(client):
+    """Test HEAD on the root endpoint returns the same headers as GET"""
+    get_response = client.get("/", headers={"Accept-Encoding": "gzip"})
+    head_response = client.head("/", headers={"Accept-Encoding": "gzip"})
+    
+    assert get_response.status_code == 200
+    assert head_response.status_code == 200
+    assert head_response.content == b""
+    assert dict(head_response.headers) == dict(get_response.headers)
+    assert "content-encoding" not in get_response.headers
+    assert get_response.headers["content-length"] == str(len(get_response.content))
+
+def test_root_etag_revalidation(client):
+    """Test the root endpoint answers a matching If-None-Match with 304"""
+    etag = client.get("/").headers["etag"]
+    
+    response = client.get("/", headers={"If-None-Match": etag})
+    
+    assert response.status_code == 304
+    assert response.headers["etag"] == etag
+
+def test_response_cache_generations_expire():
+    """Test writes invalidate cached GETs and per-user generations do not accumulate"""
+    from starlette.applications import Starlette
+    from starlette.responses import PlainTextResponse
+    from starlette.routing import Route
+    
+    calls = []
+    
+    async def endpoint(request):
+        calls.append(request.method)
+        return PlainTextResponse(str(len(calls)))
+    
+    inner = Starlette(routes=[Route("/api/items", endpoint, methods=["GET", "POST"])])
+    middleware = server.ResponseCacheMiddleware(inner)
+    cache_client = TestClient(middleware)
+    headers = {"user-id": "user1"}
+    
+    assert cache_client.get("/api/items", headers=headers).text == "1"
+    assert cache_client.get("/api/items", headers=headers).text == "1"  # Served from cache
+    cache_client.post("/api/items", headers=headers)
+    assert cache_client.get("/api/items", headers=headers).text == "3"
+    
+    assert middleware.generations.ttl >= server.RESPONSE_CACHE_TTL_SECONDS
+    middleware.generations.expire(middleware.generations.timer() + middleware.generations.ttl)
+    assert len(middleware.generations) == 0
+
+if __name__ == "__main__":
+    pytest.main([__file__])
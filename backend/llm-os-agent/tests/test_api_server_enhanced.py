@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Unit tests for enhanced API server session handling
+"""
+
+import pytest
+import asyncio
+import threading
+import sys
+import os
+from unittest.mock import Mock
+
+# Add parent directory to path to import modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_URL", "sqlite:///:memory:")
+
+from fastapi import HTTPException
+import api_server_enhanced as server
+
+class FakeSSHManager:
+    """SSHManager stand-in that tracks open connections"""
+    def __init__(self):
+        self.connections = {}
+    
+    def connect_and_store(self, hostname, username, password, port=22):
+        connection_id = f"conn_{len(self.connections)}"
+        self.connections[connection_id] = {"hostname": hostname}
+        return {"success": True, "connection_id": connection_id}
+    
+    def disconnect(self, connection_id):
+        return self.connections.pop(connection_id, None) is not None
+
+@pytest.fixture
+def session():
+    """Fresh user session backed by a fake SSH manager"""
+    user_session = server.UserSession(ssh_manager=FakeSSHManager())
+    server.user_sessions["test_user"] = user_session
+    yield user_session
+    server.user_sessions.pop("test_user", None)
+
+def test_connect_closes_ssh_when_user_upsert_fails(session):
+    """Test that a failed user upsert does not leave an untracked SSH connection open"""
+    db_service = Mock()
+    db_service.create_or_get_user.side_effect = RuntimeError("database unavailable")
+    ssh_request = server.SSHConnectionRequest(hostname="example.com", username="admin", password="secret")
+    
+    with pytest.raises(HTTPException) as exc_info:
+        asyncio.run(server.connect_to_server(Mock(), ssh_request, "test_user", db_service))
+    
+    assert exc_info.value.status_code == 500
+    assert session.ssh_manager.connections == {}
+    assert session.connections == {}
+    assert session.alive == set()
+    db_service.create_connection.assert_not_called()
+
+def test_reconnect_forgets_previous_agent(session):
+    """Test that replacing an active connection drops its cached agent bookkeeping"""
+    session.ssh_manager.connections["old_conn"] = {"hostname": "example.com"}
+    session.connections["old_conn"] = {"status": server.STATUS_CONNECTED}
+    session.alive.add("old_conn")
+    session.agents["old_conn"] = Mock()
+    server.agent_started_at[("test_user", "old_conn")] = 0.0
+    server.agent_init_locks[("test_user", "old_conn")]
+    db_service = Mock()
+    db_service.create_or_get_user.side_effect = RuntimeError("database unavailable")
+    ssh_request = server.SSHConnectionRequest(hostname="example.com", username="admin", password="secret")
+    
+    with pytest.raises(HTTPException):
+        asyncio.run(server.connect_to_server(Mock(), ssh_request, "test_user", db_service))
+    
+    assert "old_conn" not in session.agents
+    assert ("test_user", "old_conn") not in server.agent_started_at
+    assert ("test_user", "old_conn") not in server.agent_init_locks
+
+def test_llm_slot_held_until_timed_out_call_finishes(monkeypatch):
+    """Test that a timed-out plan generation keeps its LLM slot until the thread returns"""
+    finish = threading.Event()
+    
+    class SlowGenerator:
+        def generate_commands(self, request):
+            finish.wait(5)
+            return {"steps": []}
+    
+    server.user_sessions["test_user"] = server.UserSession(agents={"conn": Mock(command_generator=SlowGenerator())})
+    monkeypatch.setattr(server, "LLM_TIMEOUT_SECONDS", 0.05)
+    
+    async def scenario():
+        monkeypatch.setattr(server, "llm_semaphore", asyncio.Semaphore(1))
+        with pytest.raises(HTTPException) as exc_info:
+            await server.generate_command_plan("test_user", "conn", "check disk")
+        assert exc_info.value.status_code == 504
+        assert server.llm_semaphore.locked()  # The call is still running
+        
+        finish.set()
+        for _ in range(100):
+            if not server.llm_semaphore.locked():
+                break
+            await asyncio.sleep(0.01)
+        assert not server.llm_semaphore.locked()
+    
+    try:
+        asyncio.run(scenario())
+    finally:
+        finish.set()
+        server.user_sessions.pop("test_user", None)
+
+if __name__ == "__main__":
+    pytest.main([__file__])
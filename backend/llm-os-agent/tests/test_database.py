@@ -154,6 +154,88 @@ def test_step_approval(db_service):
     assert step_status[1]["status"] == "rejected"
     assert not db_service.is_command_fully_approved(command.id)
 
+def test_append_step_result(db_service):
+    """Test appending step results to a command's execution results"""
+    user = db_service.create_or_get_user("test_user", "test@example.com")
+    connection = db_service.create_connection(
+        user_id="test_user",
+        hostname="test.example.com",
+        username="testuser",
+        encrypted_credentials="encrypted_data"
+    )
+    command = db_service.create_command(
+        user_id="test_user",
+        connection_id=connection.id,
+        request="Check system status",
+        intent="System monitoring",
+        action="List files and check disk",
+        risk_level="low",
+        priority="normal",
+        generated_commands=[{"command": "ls -la"}, {"command": "df -h"}]
+    )
+
+    db_service.append_step_result_atomic(command.id, {"step_index": 0, "success": True, "execution_time": 0.5}, 2)
+    results = db_service.get_command(command.id, "test_user").execution_results
+    assert results["successful_steps"] == 1
+    assert results["success"] is None  # One step still to run
+
+    db_service.append_step_result_atomic(command.id, {"step_index": 1, "success": False, "execution_time": 0.25}, 2)
+    db_service.db.expire_all()
+    command = db_service.get_command(command.id, "test_user")
+
+    assert [step["step_index"] for step in command.execution_results["step_results"]] == [0, 1]
+    assert command.execution_results["failed_steps"] == 1
+    assert command.execution_results["total_execution_time"] == 0.75
+    assert command.execution_results["success"] == False
+    assert command.executed_at is not None
+
+def test_append_step_results_batch(db_service):
+    """Test appending a batch of step results in one call"""
+    user = db_service.create_or_get_user("test_user", "test@example.com")
+    connection = db_service.create_connection(
+        user_id="test_user",
+        hostname="test.example.com",
+        username="testuser",
+        encrypted_credentials="encrypted_data"
+    )
+    command = db_service.create_command(
+        user_id="test_user",
+        connection_id=connection.id,
+        request="Check system status",
+        intent="System monitoring",
+        action="List files and check disk",
+        risk_level="low",
+        priority="normal",
+        generated_commands=[{"command": "ls -la"}, {"command": "df -h"}, {"command": "uptime"}]
+    )
+
+    db_service.append_step_results_atomic(command.id, [
+        {"step_index": 0, "success": True, "execution_time": 0.5},
+        {"step_index": 1, "success": True, "execution_time": 0.25},
+        {"step_index": 2, "success": True, "execution_time": 0.25},
+    ], 3)
+    db_service.db.expire_all()
+    command = db_service.get_command(command.id, "test_user")
+
+    assert [step["step_index"] for step in command.execution_results["step_results"]] == [0, 1, 2]
+    assert command.execution_results["successful_steps"] == 3
+    assert command.execution_results["failed_steps"] == 0
+    assert command.execution_results["total_execution_time"] == 1.0
+    assert command.execution_results["success"] == True
+
+def test_append_step_result_postgres_statement():
+    """Test the PostgreSQL append statement compiles to a single jsonb UPDATE"""
+    from sqlalchemy.dialects import postgresql
+    from database_service import APPEND_STEP_RESULT_SQL
+
+    sql = str(APPEND_STEP_RESULT_SQL.compile(dialect=postgresql.dialect()))
+
+    assert sql.lstrip().startswith("UPDATE commands SET")
+    assert "|| CAST(%(step_results)s AS jsonb)" in sql
+    assert "jsonb_build_object(" in sql and "'step_results', coalesce(" in sql
+    assert "%(success_delta)s" in sql and "%(failure_delta)s" in sql
+    assert sql.rstrip().endswith("WHERE id = %(command_id)s")
+
 def test_audit_logging(db_service):
     """Test audit logging"""
     # Create user first
@@ -176,6 +258,26 @@ def test_audit_logging(db_service):
     assert logs[0].success == True
     assert logs[0].details == {"test": "data"}
 
+def test_bulk_audit_logging(db_service):
+    """Test batched audit logging"""
+    user = db_service.create_or_get_user("test_user", "test@example.com")
+    
+    # Entries may set different optional fields
+    db_service.bulk_log_actions([
+        {"user_id": "test_user", "action": "connect", "details": {"hostname": "example.com"}},
+        {"user_id": "test_user", "action": "connect_failed", "success": False, "error_message": "timeout"},
+    ])
+    
+    logs = db_service.get_audit_logs(user_id="test_user", limit=10)
+    
+    assert len(logs) == 2
+    by_action = {log.action: log for log in logs}
+    assert by_action["connect"].success == True
+    assert by_action["connect"].details == {"hostname": "example.com"}
+    assert by_action["connect_failed"].success == False
+    assert by_action["connect_failed"].error_message == "timeout"
+    assert all(log.timestamp is not None for log in logs)
+
 def test_user_connections(db_service):
     """Test getting user connections"""
     # Create user and multiple connections
@@ -202,5 +304,28 @@ def test_user_connections(db_service):
     assert connections[0].hostname in ["server1.example.com", "server2.example.com"]
     assert connections[1].hostname in ["server1.example.com", "server2.example.com"]
 
+def test_user_active_connection_ids(db_service):
+    """Test getting only the ids of a user's active connections"""
+    user = db_service.create_or_get_user("test_user", "test@example.com")
+    
+    conn1 = db_service.create_connection(
+        user_id="test_user",
+        hostname="server1.example.com",
+        username="user1",
+        encrypted_credentials="encrypted_data1"
+    )
+    
+    conn2 = db_service.create_connection(
+        user_id="test_user",
+        hostname="server2.example.com",
+        username="user2",
+        encrypted_credentials="encrypted_data2"
+    )
+    
+    db_service.disconnect_connection(conn2.id)
+    
+    assert db_service.get_user_active_connection_ids("test_user") == {conn1.id}
+    assert db_service.get_user_active_connection_ids("other_user") == set()
+
 if __name__ == "__main__":
     pytest.main([__file__])
@@ -4,6 +4,7 @@ Unit tests for security validation and sanitization
 """
 
 import pytest
+import base64
 import sys
 import os
 
@@ -11,6 +12,7 @@ import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from security import SecurityValidator, SecurityLevel
+from secrets_manager import SecretsManager
 
 def test_validate_hostname():
     """Test hostname validation"""
@@ -159,5 +161,20 @@ def test_check_command_blacklist():
     assert SecurityValidator.check_command_blacklist("rm -rf /", blacklist) == False
     assert SecurityValidator.check_command_blacklist("dd if=/dev/zero", blacklist) == False
 
+def test_secrets_round_trip(monkeypatch):
+    """Test credential encryption round trip and reading legacy Fernet values"""
+    monkeypatch.setenv("OTIUM_ENCRYPTION_KEY", SecretsManager.generate_encryption_key())
+    manager = SecretsManager()
+    credentials = {"hostname": "example.com", "username": "admin", "password": "s3cret", "port": 22}
+    
+    encrypted = manager.encrypt_credentials(credentials)
+    assert "s3cret" not in encrypted
+    assert manager.decrypt_credentials(encrypted) == credentials
+    assert manager.decrypt_text(manager.encrypt_text("hello")) == "hello"
+    
+    # Values stored before the AES-GCM switch are base64-wrapped Fernet tokens
+    legacy = base64.b64encode(manager.cipher.encrypt(b"legacy-key")).decode()
+    assert manager.decrypt_api_key(legacy) == "legacy-key"
+
 if __name__ == "__main__":
     pytest.main([__file__])
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Database Migration Script for Recent-Activity Indexes
+Adds the indexes used by the "most recent first" queries on commands and audit logs
+"""
+
+import os
+import sys
+from sqlalchemy import create_engine, text
+
+# Add the llm-os-agent directory to the path
+sys.path.append(os.path.join(os.path.dirname(__file__), 'llm-os-agent'))
+
+from database import DATABASE_URL
+
+# Same names SQLAlchemy gives the index=True columns, so create_all and this
+# script never build duplicates
+INDEXES = [
+    ("ix_commands_created_at", "commands", "created_at"),
+    ("ix_audit_logs_timestamp", "audit_logs", "timestamp"),
+]
+
+def run_migration():
+    """Create the recent-activity indexes if they do not exist yet"""
+    
+    print("🚀 Starting Recent-Activity Index Migration...")
+    print(f"📊 Database URL: {DATABASE_URL[:50]}..." if len(DATABASE_URL) > 50 else DATABASE_URL)
+    
+    try:
+        engine = create_engine(DATABASE_URL)
+        
+        with engine.connect() as conn:
+            for index_name, table, column in INDEXES:
+                try:
+                    conn.execute(text(f"CREATE INDEX IF NOT EXISTS {index_name} ON {table} ({column})"))
+                    conn.commit()
+                    print(f"   ✅ Index '{index_name}' on {table}({column}) ready")
+                except Exception as e:
+                    print(f"   ⚠️  Could not create index '{index_name}': {e}")
+                    conn.rollback()
+        
+        print("✅ Migration completed successfully!")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Migration failed: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+if __name__ == "__main__":
+    success = run_migration()
+    sys.exit(0 if success else 1)